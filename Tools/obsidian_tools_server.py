@@ -7,20 +7,44 @@ Provides both Note Query/Modification and Search/Replace functionality
 print("Obsidian Tools Server script starting...")
 
 import os
+import sys
 import re
 import json
 import yaml
 import fnmatch
+import bisect
+import copy
+import functools
+import array
 import shutil
+import hashlib
+import sqlite3
+import pickle
+import atexit
+from contextlib import closing
 from datetime import datetime
 from pathlib import Path
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, Response, stream_with_context
 from flask_cors import CORS
 import logging
 import socket
+import uuid
+import select
+import struct
+import time
+import ctypes
+import ctypes.util
 # For the reminders sync
 import threading
 import subprocess
+import concurrent.futures
+import multiprocessing
+
+# Optional production WSGI server (pip install waitress); Flask's own server is used without it
+try:
+    import waitress
+except ImportError:
+    waitress = None
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -37,6 +61,13 @@ SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 CONFIG_FILE = os.path.join(SCRIPT_DIR, "vault_config.json")
 DEFAULT_VAULT_PATH = "/Users/tonythem/Obsidian/tonythem/"
 DEFAULT_BACKUP_PATH = "/Users/tonythem/Obsidian/backups/"
+# 'full' copies the whole vault; 'snapshot' hard-links files unchanged since the last backup;
+# 'journal' only keeps the original bytes of the files an operation is about to write;
+# 'content' stores deduplicated blobs by hash plus a small manifest per backup
+BACKUP_MODES = ('full', 'snapshot', 'journal', 'content')
+DEFAULT_BACKUP_MODE = 'snapshot'
+JOURNAL_KEEP_COUNT = 50
+CONTENT_KEEP_COUNT = 30
 # For the reminders sync
 # Add these after your existing app configuration
 app.config['REMINDERS_LOGS_DIR'] = '/Users/tonythem/Github/obsidian/Reminders/Logs'
@@ -56,7 +87,8 @@ def load_config():
     # Return default config
     return {
         'vault_path': DEFAULT_VAULT_PATH,
-        'backup_path': DEFAULT_BACKUP_PATH
+        'backup_path': DEFAULT_BACKUP_PATH,
+        'backup_mode': DEFAULT_BACKUP_MODE
     }
 
 # Save configuration
@@ -74,34 +106,65 @@ def save_config(config):
 config = load_config()
 VAULT_PATH = config['vault_path']
 BACKUP_PATH = config['backup_path']
+BACKUP_MODE = config.get('backup_mode', DEFAULT_BACKUP_MODE)
+# Content search worker processes (search_workers in vault_config.json)
+SEARCH_WORKERS = int(config.get('search_workers') or os.cpu_count() or 1)
+SEARCH_CHUNK_SIZE = 64
+SEARCH_PARALLEL_MIN_FILES = 256
+# Request threads when served by waitress (server_threads in vault_config.json)
+SERVER_THREADS = int(config.get('server_threads') or 8)
 # Save logs in script directory, not vault
-LOG_FILE = os.path.join(SCRIPT_DIR, "modification_log.json")
+LOG_DIR = os.path.join(SCRIPT_DIR, "modification_log")
+LOG_SEGMENT_MAX_BYTES = 16 * 1024 * 1024
+# Pre-JSONL log (one big JSON array), migrated into LOG_DIR on first use
+LEGACY_LOG_FILE = os.path.join(SCRIPT_DIR, "modification_log.json")
 SAVED_QUERIES_FILE = os.path.join(SCRIPT_DIR, "saved_queries.json")
+# Frontmatter and folder tree saved between runs, so restarts start warm
+INDEX_DB_FILE = os.path.join(SCRIPT_DIR, "vault_index.sqlite3")
+INDEX_FLUSH_INTERVAL = 5.0
+# Full-text (FTS5) index of note lines for mode: "indexed" searches, built on first use
+FULL_TEXT_DB_FILE = os.path.join(SCRIPT_DIR, "vault_fts.sqlite3")
 
 # ============== Shared Functions ==============
 
+def new_backup_stamp():
+    """Timestamp plus a random suffix, so backups made in the same second get distinct names"""
+    return f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{uuid.uuid4().hex[:8]}"
+
+def parse_backup_stamp(stamp):
+    """Datetime of a backup name's stamp: 20240614_101500 or 20240614_101500_123456_<suffix>"""
+    parts = stamp.split('_')
+    timestamp = datetime.strptime(f"{parts[0]}_{parts[1]}", "%Y%m%d_%H%M%S")
+    if len(parts) > 2:
+        timestamp = timestamp.replace(microsecond=int(parts[2]))
+    return timestamp
+
+def list_backup_dirs():
+    """Return (path, timestamp) of every vault backup, newest first"""
+    backup_dirs = []
+    for item in os.listdir(BACKUP_PATH):
+        item_path = os.path.join(BACKUP_PATH, item)
+        if os.path.isdir(item_path) and item.startswith('tonythem_backup_'):
+            # Extract timestamp from directory name
+            try:
+                timestamp = parse_backup_stamp(item[len('tonythem_backup_'):])
+                backup_dirs.append((item_path, timestamp))
+            except (ValueError, IndexError):
+                # Skip directories that don't match the expected format
+                continue
+    
+    # Sort by timestamp (newest first)
+    backup_dirs.sort(key=lambda x: (x[1], x[0]), reverse=True)
+    return backup_dirs
+
 def cleanup_old_backups(keep_count=3):
     """Remove old backups, keeping only the most recent ones"""
     try:
         if not os.path.exists(BACKUP_PATH):
             return
         
-        # Get all backup directories
-        backup_dirs = []
-        for item in os.listdir(BACKUP_PATH):
-            item_path = os.path.join(BACKUP_PATH, item)
-            if os.path.isdir(item_path) and item.startswith('tonythem_backup_'):
-                # Extract timestamp from directory name
-                try:
-                    timestamp_str = item.replace('tonythem_backup_', '')
-                    timestamp = datetime.strptime(timestamp_str, "%Y%m%d_%H%M%S")
-                    backup_dirs.append((item_path, timestamp))
-                except ValueError:
-                    # Skip directories that don't match the expected format
-                    continue
-        
-        # Sort by timestamp (newest first)
-        backup_dirs.sort(key=lambda x: x[1], reverse=True)
+        # Get all backup directories (full copies and snapshots alike)
+        backup_dirs = list_backup_dirs()
         
         # Remove old backups
         if len(backup_dirs) > keep_count:
@@ -118,18 +181,313 @@ def cleanup_old_backups(keep_count=3):
         logger.error(f"Error during backup cleanup: {e}")
         return 0
 
-def create_backup():
-    """Create a backup of the vault"""
+def create_snapshot(source, destination, previous=None):
+    """Copy source to destination like rsync --link-dest.
+
+    Files whose size and mtime match the copy in the previous snapshot are
+    hard-linked to it instead of copied, so each snapshot is a complete tree
+    but only changed files take time and space. Returns (linked, copied).
+    """
+    linked = copied = 0
+    
+    for dirpath, dirs, filenames in os.walk(source, followlinks=True):
+        relative_dir = os.path.relpath(dirpath, source)
+        target_dir = os.path.normpath(os.path.join(destination, relative_dir))
+        os.makedirs(target_dir, exist_ok=True)
+        
+        for filename in filenames:
+            source_file = os.path.join(dirpath, filename)
+            target_file = os.path.join(target_dir, filename)
+            
+            if previous:
+                previous_file = os.path.normpath(os.path.join(previous, relative_dir, filename))
+                try:
+                    current_stat = os.stat(source_file)
+                    previous_stat = os.stat(previous_file)
+                    if (current_stat.st_size == previous_stat.st_size and
+                            current_stat.st_mtime_ns == previous_stat.st_mtime_ns):
+                        os.link(previous_file, target_file)
+                        linked += 1
+                        continue
+                except OSError:
+                    # Missing in the previous snapshot, or links unsupported: copy instead
+                    pass
+            
+            # Never write through an existing target: it may be a hard link
+            # shared with older snapshots
+            temp_file = target_file + '.snapshot-tmp'
+            shutil.copy2(source_file, temp_file)
+            os.replace(temp_file, target_file)
+            copied += 1
+    
+    return linked, copied
+
+def journal_dir(operation_id):
+    return os.path.join(BACKUP_PATH, f"tonythem_journal_{operation_id}")
+
+def journal_operation_id(backup_path):
+    """Operation id of a journal backup path, or None for vault backups"""
+    name = os.path.basename(backup_path or '')
+    if name.startswith('tonythem_journal_'):
+        return name[len('tonythem_journal_'):]
+    return None
+
+def create_journal(files):
+    """Copy the original bytes of the files an operation will write into a journal.
+
+    The journal holds files/<relative path> copies plus a manifest.json that
+    records which files existed beforehand. Returns the journal directory.
+    """
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    operation_id = f"{timestamp}_{uuid.uuid4().hex[:8]}"
+    journal_path = journal_dir(operation_id)
+    os.makedirs(journal_path)
+    
+    entries = []
+    seen = set()
+    for file_path in files:
+        full_path = file_path if os.path.isabs(file_path) else os.path.join(VAULT_PATH, file_path)
+        relative_path = os.path.relpath(full_path, VAULT_PATH)
+        if relative_path.startswith('..'):
+            raise ValueError(f"File is outside the vault: {file_path}")
+        if relative_path in seen:
+            continue
+        seen.add(relative_path)
+        
+        existed = os.path.isfile(full_path)
+        if existed:
+            journal_file = os.path.join(journal_path, 'files', relative_path)
+            os.makedirs(os.path.dirname(journal_file), exist_ok=True)
+            shutil.copy2(full_path, journal_file)
+        entries.append({'path': relative_path, 'existed': existed})
+    
+    write_journal_manifest(journal_path, {
+        'operation_id': operation_id,
+        'created': datetime.now().isoformat(),
+        'vault_path': VAULT_PATH,
+        'files': entries,
+        'renames': []
+    })
+    
+    cleanup_old_journals(keep_count=JOURNAL_KEEP_COUNT)
+    return journal_path
+
+def read_journal_manifest(journal_path):
+    with open(os.path.join(journal_path, 'manifest.json'), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def write_journal_manifest(journal_path, manifest):
+    manifest_file = os.path.join(journal_path, 'manifest.json')
+    with open(manifest_file + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(manifest_file + '.tmp', manifest_file)
+
+def record_journal_rename(journal_path, old_path, new_path):
+    """Note a rename done by the operation so a restore can undo it"""
+    if not journal_operation_id(journal_path):
+        return
+    try:
+        manifest = read_journal_manifest(journal_path)
+        manifest['renames'].append({
+            'from': os.path.relpath(old_path, manifest['vault_path']),
+            'to': os.path.relpath(new_path, manifest['vault_path'])
+        })
+        write_journal_manifest(journal_path, manifest)
+    except Exception as e:
+        logger.error(f"Error recording rename in journal {journal_path}: {e}")
+
+def restore_journal(operation_id):
+    """Put every file of a journal back to its pre-operation bytes.
+
+    Files the operation created are removed and renames are undone.
+    Returns the list of restored relative paths.
+    """
+    journal_path = journal_dir(operation_id)
+    manifest = read_journal_manifest(journal_path)
+    vault_path = manifest['vault_path']
+    
+    def vault_file(relative_path):
+        full_path = os.path.normpath(os.path.join(vault_path, relative_path))
+        if os.path.relpath(full_path, vault_path).startswith('..'):
+            raise ValueError(f"Journal path escapes the vault: {relative_path}")
+        return full_path
+    
+    restored = []
+    
+    # Undo renames: the renamed-to file goes away, its original comes back below
+    for rename in reversed(manifest.get('renames', [])):
+        new_path = vault_file(rename['to'])
+        if os.path.exists(new_path):
+            os.remove(new_path)
+    
+    for entry in manifest['files']:
+        full_path = vault_file(entry['path'])
+        if entry['existed']:
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            temp_path = full_path + '.restore-tmp'
+            shutil.copy2(os.path.join(journal_path, 'files', entry['path']), temp_path)
+            os.replace(temp_path, full_path)
+        elif os.path.exists(full_path):
+            os.remove(full_path)
+        restored.append(entry['path'])
+    
+    return restored
+
+def cleanup_old_journals(keep_count=JOURNAL_KEEP_COUNT):
+    """Remove old journals, keeping only the most recent ones"""
+    journals = sorted(
+        (item for item in os.listdir(BACKUP_PATH) if item.startswith('tonythem_journal_')),
+        reverse=True
+    )
+    for item in journals[keep_count:]:
+        try:
+            shutil.rmtree(os.path.join(BACKUP_PATH, item))
+            logger.info(f"Removed old journal: {item}")
+        except Exception as e:
+            logger.error(f"Error removing journal {item}: {e}")
+
+def content_store_dir():
+    return os.path.join(BACKUP_PATH, 'tonythem_store')
+
+def list_content_manifests():
+    """Paths of every content-store manifest, newest first"""
+    manifests_dir = os.path.join(content_store_dir(), 'manifests')
+    if not os.path.isdir(manifests_dir):
+        return []
+    names = sorted((n for n in os.listdir(manifests_dir) if n.endswith('.json')), reverse=True)
+    return [os.path.join(manifests_dir, name) for name in names]
+
+def store_blob(file_path, blobs_dir):
+    """Hash a file while copying it into the blob store; returns its sha256"""
+    digest = hashlib.sha256()
+    temp_path = os.path.join(blobs_dir, f".incoming-{uuid.uuid4().hex}")
+    with open(file_path, 'rb') as source, open(temp_path, 'wb') as target:
+        for chunk in iter(lambda: source.read(1024 * 1024), b''):
+            digest.update(chunk)
+            target.write(chunk)
+    
+    file_hash = digest.hexdigest()
+    blob_path = os.path.join(blobs_dir, file_hash[:2], file_hash[2:])
+    if os.path.exists(blob_path):
+        os.remove(temp_path)
+    else:
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        os.replace(temp_path, blob_path)
+    return file_hash
+
+def create_content_backup():
+    """Back up the vault into the content-addressed store.
+
+    Blobs live under blobs/ab/cdef... and each backup is a manifest mapping
+    relative paths to [hash, size, mtime]. Files whose size and mtime match
+    the previous manifest reuse its hash without being read. Returns the
+    manifest path.
+    """
+    store_dir = content_store_dir()
+    blobs_dir = os.path.join(store_dir, 'blobs')
+    manifests_dir = os.path.join(store_dir, 'manifests')
+    os.makedirs(blobs_dir, exist_ok=True)
+    os.makedirs(manifests_dir, exist_ok=True)
+    
+    previous_files = {}
+    previous = list_content_manifests()
+    if previous:
+        with open(previous[0], 'r', encoding='utf-8') as f:
+            previous_files = json.load(f).get('files', {})
+    
+    files = {}
+    hashed = 0
+    for dirpath, dirs, filenames in os.walk(VAULT_PATH, followlinks=True):
+        for filename in filenames:
+            full_path = os.path.join(dirpath, filename)
+            relative_path = os.path.relpath(full_path, VAULT_PATH)
+            stat = os.stat(full_path)
+            
+            known = previous_files.get(relative_path)
+            if known and known[1] == stat.st_size and known[2] == stat.st_mtime_ns:
+                files[relative_path] = known
+                continue
+            
+            files[relative_path] = [store_blob(full_path, blobs_dir), stat.st_size, stat.st_mtime_ns]
+            hashed += 1
+    
+    # Unique per backup: os.replace would overwrite a manifest from the same second
+    manifest_path = os.path.join(manifests_dir, f"tonythem_manifest_{new_backup_stamp()}.json")
+    temp_path = manifest_path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'created': datetime.now().isoformat(),
+            'vault_path': VAULT_PATH,
+            'files': files
+        }, f)
+    os.replace(temp_path, manifest_path)
+    
+    logger.info(f"Content backup: {hashed} file(s) hashed, {len(files) - hashed} unchanged")
+    
+    cleanup_content_store(keep_count=CONTENT_KEEP_COUNT)
+    return manifest_path
+
+def cleanup_content_store(keep_count=CONTENT_KEEP_COUNT):
+    """Drop old manifests and any blob no remaining manifest refers to"""
+    manifests = list_content_manifests()
+    if len(manifests) <= keep_count:
+        return 0
+    
+    for manifest_path in manifests[keep_count:]:
+        os.remove(manifest_path)
+    
+    referenced = set()
+    for manifest_path in manifests[:keep_count]:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            referenced.update(entry[0] for entry in json.load(f)['files'].values())
+    
+    blobs_dir = os.path.join(content_store_dir(), 'blobs')
+    removed = 0
+    for prefix in os.listdir(blobs_dir):
+        prefix_dir = os.path.join(blobs_dir, prefix)
+        if not os.path.isdir(prefix_dir):
+            continue
+        for name in os.listdir(prefix_dir):
+            if prefix + name not in referenced:
+                os.remove(os.path.join(prefix_dir, name))
+                removed += 1
+    
+    logger.info(f"Removed {len(manifests) - keep_count} old manifest(s) and {removed} unreferenced blob(s)")
+    return removed
+
+def create_backup(files=None):
+    """Create a backup of the vault.
+
+    In 'journal' mode, with the list of files the operation will write,
+    only those files are backed up.
+    """
     try:
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_name = f"tonythem_backup_{timestamp}"
+        backup_name = f"tonythem_backup_{new_backup_stamp()}"
         backup_full_path = os.path.join(BACKUP_PATH, backup_name)
         
         # Create backup directory if it doesn't exist
         os.makedirs(BACKUP_PATH, exist_ok=True)
         
-        # Use shutil for cross-platform compatibility
-        shutil.copytree(VAULT_PATH, backup_full_path)
+        if BACKUP_MODE == 'journal' and files is not None:
+            journal_path = create_journal(files)
+            logger.info(f"Journal created for {len(files)} file(s): {journal_path}")
+            return True, journal_path
+        
+        if BACKUP_MODE == 'content':
+            manifest_path = create_content_backup()
+            logger.info(f"Backup created: {manifest_path}")
+            return True, manifest_path
+        
+        if BACKUP_MODE == 'snapshot':
+            # Hard-link unchanged files from the newest existing backup
+            previous = list_backup_dirs()
+            previous_path = previous[0][0] if previous else None
+            os.makedirs(backup_full_path)
+            linked, copied = create_snapshot(VAULT_PATH, backup_full_path, previous_path)
+            logger.info(f"Snapshot: {copied} file(s) copied, {linked} hard-linked")
+        else:
+            # Use shutil for cross-platform compatibility
+            shutil.copytree(VAULT_PATH, backup_full_path)
         
         logger.info(f"Backup created: {backup_full_path}")
         
@@ -143,116 +501,1504 @@ def create_backup():
         logger.error(f"Error creating backup: {e}")
         return False, str(e)
 
-def read_frontmatter(file_path):
-    """Extract YAML frontmatter from a markdown file"""
+FRONTMATTER_READ_CHUNK = 4096
+
+def read_frontmatter_block(f):
+    """YAML text between the opening '---' and the next '---', reading no further; None if absent"""
+    buffer = f.read(3)
+    if buffer != '---':
+        return None
+    
+    search_from = 3
+    while True:
+        end = buffer.find('---', search_from)
+        if end != -1:
+            return buffer[3:end]
+        chunk = f.read(FRONTMATTER_READ_CHUNK)
+        if not chunk:
+            return None
+        # The delimiter may straddle the chunk boundary
+        search_from = max(3, len(buffer) - 2)
+        buffer += chunk
+
+# libyaml's loader is several times faster than the pure-Python one
+YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+SIMPLE_YAML_TAGS = {
+    'tag:yaml.org,2002:str', 'tag:yaml.org,2002:bool', 'tag:yaml.org,2002:int',
+    'tag:yaml.org,2002:float', 'tag:yaml.org,2002:null', 'tag:yaml.org,2002:timestamp'
+}
+simple_yaml_resolver = yaml.resolver.Resolver()
+simple_yaml_constructor = yaml.constructor.SafeConstructor()
+
+@functools.lru_cache(maxsize=4096)
+def construct_simple_scalar(text, plain=True):
+    """Value of a one-line scalar exactly as safe_load builds it, or raises ValueError if unsupported"""
+    if plain:
+        # Plain scalars that could start a structure, comment, anchor, etc.
+        if (not text or text != text.strip(' ') or text[0] in '-?:,[]{}#&*!|>\'"%@`'
+                or ': ' in text or ' #' in text or text.endswith(':')):
+            raise ValueError(text)
+        tag = simple_yaml_resolver.resolve(yaml.nodes.ScalarNode, text, (True, False))
+        if tag not in SIMPLE_YAML_TAGS:
+            raise ValueError(text)
+    else:
+        tag = 'tag:yaml.org,2002:str'
+    node = yaml.nodes.ScalarNode(tag, text)
+    return simple_yaml_constructor.yaml_constructors[tag](simple_yaml_constructor, node)
+
+def parse_simple_value(text):
+    """A plain, or escape-free single/double quoted, one-line scalar"""
+    if text[:1] in ('"', "'"):
+        quote = text[0]
+        if len(text) < 2 or text[-1] != quote or quote in text[1:-1] or '\\' in text[1:-1]:
+            raise ValueError(text)
+        return construct_simple_scalar(text[1:-1], plain=False)
+    return construct_simple_scalar(text)
+
+def scan_simple_yaml(text):
+    """Parse the common Obsidian frontmatter subset without the YAML parser.
+
+    Handles top-level 'key: value' lines with plain or quoted scalars and
+    '- item' block lists. Returns None for anything else (comments, flow
+    collections, multi-line scalars, nesting, escapes...), so the caller
+    can fall back to the full parser.
+    """
+    if '\t' in text or '\r' in text or '\ufeff' in text or yaml.reader.Reader.NON_PRINTABLE.search(text):
+        return None
+    # Other line breaks YAML recognizes
+    if '\x85' in text or '\u2028' in text or '\u2029' in text:
+        return None
+    
+    result = {}
+    list_key = None
+    list_indent = None
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        # Check if file has frontmatter
-        if not content.startswith('---'):
-            return None, content
-        
-        # Find the closing ---
-        parts = content.split('---', 2)
-        if len(parts) < 3:
-            return None, content
-        
-        # Parse YAML
-        try:
-            frontmatter = yaml.safe_load(parts[1])
-            return frontmatter or {}, '---'.join(['', parts[1], parts[2]])
-        except yaml.YAMLError as e:
-            logger.error(f"YAML parse error in {file_path}: {e}")
-            return None, content
+        for line in text.split('\n'):
+            stripped = line.strip(' ')
+            if not stripped:
+                continue
+            
+            if list_key is not None and stripped[0] == '-' and (stripped == '-' or stripped[1] == ' '):
+                indent = len(line) - len(line.lstrip(' '))
+                if list_indent is None:
+                    list_indent = indent
+                    result[list_key] = []
+                elif indent != list_indent:
+                    return None
+                item = stripped[1:].strip(' ')
+                result[list_key].append(parse_simple_value(item) if item else None)
+                continue
+            
+            if line[0] == ' ':
+                return None
+            list_key = None
             
+            # key: value, or key: followed by list items (or nothing)
+            if line.endswith(':'):
+                key_text, value_text = line[:-1], ''
+            else:
+                colon = line.find(': ')
+                if colon == -1:
+                    return None
+                key_text, value_text = line[:colon], line[colon + 2:].strip(' ')
+            
+            key = construct_simple_scalar(key_text)
+            if not isinstance(key, str):
+                return None
+            
+            if value_text:
+                result[key] = parse_simple_value(value_text)
+            else:
+                result[key] = None
+                list_key = key
+                list_indent = None
+    except (ValueError, yaml.YAMLError):
+        return None
+    
+    return result or None
+
+def parse_frontmatter_yaml(text):
+    """Parse a frontmatter block, trying the simple-subset scanner before the YAML parser"""
+    frontmatter = scan_simple_yaml(text)
+    if frontmatter is None:
+        frontmatter = yaml.load(text, Loader=YAML_LOADER)
+    return frontmatter
+
+def read_frontmatter_text(file_path):
+    """Raw frontmatter block of a markdown file without reading its body; None if absent or unreadable"""
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return read_frontmatter_block(f)
     except Exception as e:
         logger.error(f"Error reading {file_path}: {e}")
-        return None, ""
+        return None
 
-def write_frontmatter(file_path, frontmatter, original_content):
-    """Write updated frontmatter back to file"""
+def parse_frontmatter_text(block, file_path):
+    """Parse a block from read_frontmatter_text; None if there is none or it is invalid"""
+    if block is None:
+        return None
+    
+    # Parse YAML
     try:
-        # Custom YAML representer for proper formatting
-        class CustomDumper(yaml.SafeDumper):
+        return parse_frontmatter_yaml(block) or {}
+    except yaml.YAMLError as e:
+        logger.error(f"YAML parse error in {file_path}: {e}")
+        return None
+
+def read_frontmatter_only(file_path):
+    """Extract YAML frontmatter from a markdown file without reading its body"""
+    return parse_frontmatter_text(read_frontmatter_text(file_path), file_path)
+
+class WriteBatch:
+    """All-or-nothing write of several vault files.
+
+    Each new content goes to a hidden temp file next to its target as soon as
+    it is staged. commit() fsyncs the temp files in one pass and then swaps
+    them in with os.replace, performing any staged renames afterwards. If
+    anything fails, every file already swapped in is restored from a hard
+    link to its original, so the vault is left as it was.
+    """
+    
+    def __init__(self):
+        self.token = uuid.uuid4().hex[:12]
+        self.writes = []  # (path, temp path)
+        self.renames = []  # (old path, new path)
+        self.statuses = {}
+        self.failed = False
+        self.lock = threading.Lock()
+    
+    def _sibling(self, file_path, suffix):
+        # Dot-prefixed and not ending in .md, so Obsidian and the vault
+        # listings never pick it up
+        directory, name = os.path.split(file_path)
+        return os.path.join(directory, f'.{name}.{self.token}.{suffix}')
+    
+    def write(self, file_path, content):
+        """Stage new content for file_path (written to a temp file immediately; thread-safe)"""
+        temp_path = self._sibling(file_path, 'tmp')
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            if os.path.exists(file_path):
+                shutil.copymode(file_path, temp_path)
+            with self.lock:
+                # Writing the same file again just replaces the staged content
+                if self.statuses.get(file_path) != 'staged':
+                    self.writes.append((file_path, temp_path))
+                    self.statuses[file_path] = 'staged'
+        except Exception as e:
+            logger.error(f"Error staging {file_path}: {e}")
+            self._remove(temp_path)
+            with self.lock:
+                self.statuses[file_path] = f'failed: {e}'
+                self.failed = True
+    
+    def rename(self, old_path, new_path):
+        """Stage a rename, applied after all content writes; an existing target fails the batch"""
+        with self.lock:
+            if (self._occupied(old_path, new_path) or
+                    any(target == new_path for _, target in self.renames)):
+                logger.error(f"Not renaming {old_path}: {new_path} already exists")
+                self.statuses[old_path] = f'failed: {os.path.basename(new_path)} already exists'
+                self.failed = True
+                return
+            self.renames.append((old_path, new_path))
+            self.statuses[old_path] = 'staged'
+    
+    @staticmethod
+    def _occupied(old_path, new_path):
+        # A case-only rename on a case-insensitive filesystem "exists" as itself
+        try:
+            return os.path.exists(new_path) and not os.path.samefile(old_path, new_path)
+        except OSError:
+            return True
+    
+    def paths(self):
+        """Every path commit() will overwrite, rename away or rename onto"""
+        with self.lock:
+            paths = [path for path, _ in self.writes]
+            for old_path, new_path in self.renames:
+                paths += [old_path, new_path]
+            return list(dict.fromkeys(paths))
+    
+    def discard(self):
+        """Drop everything staged without touching the vault"""
+        with self.lock:
+            for _, temp_path in self.writes:
+                self._remove(temp_path)
+            for path, status in self.statuses.items():
+                if status == 'staged':
+                    self.statuses[path] = 'not written'
+            self.writes = []
+            self.renames = []
+    
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
             pass
+    
+    @staticmethod
+    def _fsync(path, flags=os.O_RDONLY):
+        fd = os.open(path, flags)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    
+    def commit(self):
+        """Apply every staged change or none; returns [{'path', 'status'}]"""
+        committed = []  # (path, original link or None)
+        renamed = []
+        try:
+            if self.failed:
+                raise RuntimeError('staging failed')
+            
+            # One sync pass over all temp files instead of one per write
+            for _, temp_path in self.writes:
+                self._fsync(temp_path)
+            
+            for file_path, temp_path in self.writes:
+                original = None
+                if os.path.exists(file_path):
+                    original = self._sibling(file_path, 'orig')
+                    try:
+                        os.link(file_path, original)
+                    except OSError:
+                        shutil.copy2(file_path, original)
+                try:
+                    os.replace(temp_path, file_path)
+                except Exception as e:
+                    if original:
+                        self._remove(original)
+                    self.statuses[file_path] = f'failed: {e}'
+                    raise
+                committed.append((file_path, original))
+                self.statuses[file_path] = 'written'
+            
+            for old_path, new_path in self.renames:
+                try:
+                    # os.rename would silently replace a note created since staging
+                    if self._occupied(old_path, new_path):
+                        raise FileExistsError(f'{os.path.basename(new_path)} already exists')
+                    os.rename(old_path, new_path)
+                except Exception as e:
+                    self.statuses[old_path] = f'failed: {e}'
+                    raise
+                renamed.append((old_path, new_path))
+                self.statuses[old_path] = 'written'
+            
+            # Make the renames durable
+            if os.name == 'posix':
+                directories = {os.path.dirname(path) for path, _ in self.writes}
+                directories.update(os.path.dirname(new_path) for _, new_path in self.renames)
+                for directory in directories:
+                    try:
+                        self._fsync(directory or '.')
+                    except OSError:
+                        pass
+        except Exception as e:
+            logger.error(f"Write batch failed, rolling back: {e}")
+            for old_path, new_path in reversed(renamed):
+                try:
+                    os.rename(new_path, old_path)
+                    self._mark_rolled_back(old_path)
+                except Exception as rollback_error:
+                    logger.error(f"Error rolling back rename of {old_path}: {rollback_error}")
+            for file_path, original in reversed(committed):
+                try:
+                    if original:
+                        os.replace(original, file_path)
+                    else:
+                        os.remove(file_path)
+                    self._mark_rolled_back(file_path)
+                except Exception as rollback_error:
+                    logger.error(f"Error rolling back {file_path}: {rollback_error}")
+            for path, status in self.statuses.items():
+                if status == 'staged':
+                    self.statuses[path] = 'not written'
+        finally:
+            for _, temp_path in self.writes:
+                self._remove(temp_path)
+            for _, original in committed:
+                if original:
+                    self._remove(original)
+            for file_path in self.statuses:
+                frontmatter_index.discard(file_path)
+            for _, new_path in self.renames:
+                frontmatter_index.discard(new_path)
         
-        def represent_str(dumper, data):
-            # Check if it's a wikilink
-            if isinstance(data, str) and data.startswith('[[') and data.endswith(']]'):
-                return dumper.represent_scalar('tag:yaml.org,2002:str', data, style='"')
-            # Check if quotes are needed (contains special characters)
-            elif isinstance(data, str) and any(char in data for char in [':', '#', '@', '|', '>', '<', '!', '%', '&', '*', '?', '[', ']', '{', '}', ',']):
-                return dumper.represent_scalar('tag:yaml.org,2002:str', data, style='"')
-            # Otherwise use default representation
-            else:
-                return dumper.represent_scalar('tag:yaml.org,2002:str', data, style='')
-        
-        def represent_list(dumper, data):
-            # Force block style for lists (each item on new line with -)
-            return dumper.represent_list(data)
-        
-        # Add custom representers
-        CustomDumper.add_representer(str, represent_str)
-        CustomDumper.add_representer(list, represent_list)
-        
-        # Convert frontmatter to YAML with custom formatting
-        yaml_content = yaml.dump(
-            frontmatter, 
-            Dumper=CustomDumper,
-            default_flow_style=False,  # Force block style
-            allow_unicode=True, 
-            sort_keys=False,
-            explicit_start=False,
-            explicit_end=False
-        )
-        
-        # Reconstruct the file
-        parts = original_content.split('---', 2)
-        if len(parts) >= 3:
-            new_content = f"---\n{yaml_content}---{parts[2]}"
-        else:
-            # No existing frontmatter
-            body = original_content.lstrip()
-            new_content = f"---\n{yaml_content}---\n\n{body}"
-        
-        # Write back to file
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(new_content)
-        
-        return True
+        return [{'path': path, 'status': status} for path, status in self.statuses.items()]
+    
+    def _mark_rolled_back(self, file_path):
+        # Keep the error on the file that caused the rollback
+        if not self.statuses[file_path].startswith('failed'):
+            self.statuses[file_path] = 'rolled back'
+    
+    @property
+    def succeeded(self):
+        return all(status == 'written' for status in self.statuses.values())
+
+# Custom YAML representer for proper formatting
+class CustomDumper(yaml.SafeDumper):
+    pass
+
+def represent_str(dumper, data):
+    # Check if it's a wikilink
+    if isinstance(data, str) and data.startswith('[[') and data.endswith(']]'):
+        return dumper.represent_scalar('tag:yaml.org,2002:str', data, style='"')
+    # Check if quotes are needed (contains special characters)
+    elif isinstance(data, str) and any(char in data for char in [':', '#', '@', '|', '>', '<', '!', '%', '&', '*', '?', '[', ']', '{', '}', ',']):
+        return dumper.represent_scalar('tag:yaml.org,2002:str', data, style='"')
+    # Otherwise use default representation
+    else:
+        return dumper.represent_scalar('tag:yaml.org,2002:str', data, style='')
+
+def represent_list(dumper, data):
+    # Force block style for lists (each item on new line with -)
+    return dumper.represent_list(data)
+
+# Add custom representers (once, at import)
+CustomDumper.add_representer(str, represent_str)
+CustomDumper.add_representer(list, represent_list)
+
+def render_frontmatter(frontmatter, original_content):
+    """New file content with updated frontmatter"""
+    # Convert frontmatter to YAML with custom formatting
+    yaml_content = yaml.dump(
+        frontmatter, 
+        Dumper=CustomDumper,
+        default_flow_style=False,  # Force block style
+        allow_unicode=True, 
+        sort_keys=False,
+        explicit_start=False,
+        explicit_end=False
+    )
+    
+    # Reconstruct the file
+    parts = original_content.split('---', 2)
+    if len(parts) >= 3:
+        return f"---\n{yaml_content}---{parts[2]}"
+    else:
+        # No existing frontmatter
+        body = original_content.lstrip()
+        return f"---\n{yaml_content}---\n\n{body}"
+
+def write_frontmatter(file_path, frontmatter, original_content):
+    """Write updated frontmatter back to file"""
+    try:
+        batch = WriteBatch()
+        batch.write(file_path, render_frontmatter(frontmatter, original_content))
+        batch.commit()
+        return batch.succeeded
     except Exception as e:
         logger.error(f"Error writing {file_path}: {e}")
         return False
 
+def backup_batch(batch):
+    """create_backup() before committing a staged WriteBatch.
+
+    In journal mode only the files the batch will write or rename are
+    journaled, so restoring never touches notes the operation left alone.
+    The batch is discarded if the backup fails.
+    """
+    backup_success, backup_path = create_backup(batch.paths())
+    if not backup_success:
+        batch.discard()
+    return backup_success, backup_path
+
+def normalize_vault_path(file_path):
+    """Express a path inside the vault relative to VAULT_PATH, as the log records them"""
+    if os.path.isabs(file_path):
+        relative = os.path.relpath(file_path, VAULT_PATH)
+        if not relative.startswith('..'):
+            return relative
+    return file_path
+
+class ChangeLog:
+    """Append-only modification log stored as numbered JSONL segments.
+
+    Each entry is one line; logging costs a single buffered append. When the
+    active segment grows past max_bytes a new one is started.
+
+    Every segment has a sidecar index (NNNNNN.idx, also JSONL) recording each
+    entry's byte offset, length, timestamp, action, backup path and touched
+    files. History lookups filter on that index and then read only the
+    matching entries from the segments.
+    """
+
+    SEGMENT_SUFFIX = '.jsonl'
+    INDEX_SUFFIX = '.idx'
+
+    def __init__(self, directory, legacy_file=None, max_bytes=LOG_SEGMENT_MAX_BYTES):
+        self.directory = directory
+        self.legacy_file = legacy_file
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.handle = None
+        self.index_handle = None
+        self.number = 0
+        self.size = 0
+        # In-memory history index, loaded on first lookup
+        self.records = None
+        self.by_file = {}
+        self.by_backup = {}
+        self.by_action = {}
+
+    def segment_path(self, number):
+        return os.path.join(self.directory, f"{number:06d}{self.SEGMENT_SUFFIX}")
+
+    def index_path(self, number):
+        return os.path.join(self.directory, f"{number:06d}{self.INDEX_SUFFIX}")
+
+    def segments(self):
+        """Sorted (number, path) of every segment on disk"""
+        if not os.path.isdir(self.directory):
+            return []
+        segments = []
+        for name in os.listdir(self.directory):
+            stem = name[:-len(self.SEGMENT_SUFFIX)]
+            if name.endswith(self.SEGMENT_SUFFIX) and stem.isdigit():
+                segments.append((int(stem), os.path.join(self.directory, name)))
+        segments.sort()
+        return segments
+
+    def _open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        segments = self.segments()
+        if not segments and self.legacy_file:
+            if os.path.exists(self.legacy_file):
+                self._migrate()
+                segments = self.segments()
+            elif not os.path.exists(self.legacy_file + '.migrated'):
+                logger.warning(f"No modification log in {self.directory} and no {self.legacy_file} "
+                               f"to migrate; starting an empty history")
+
+        self._start_segment(segments[-1][0] if segments else 1)
+
+    def _start_segment(self, number):
+        if self.handle is not None:
+            self.handle.close()
+            self.index_handle.close()
+        self.number = number
+        path = self.segment_path(number)
+        self.handle = open(path, 'a', encoding='utf-8')
+        self.index_handle = open(self.index_path(number), 'a', encoding='utf-8')
+        self.size = os.path.getsize(path)
+
+    def _write(self, entry):
+        line = json.dumps(entry, default=str) + '\n'
+        length = len(line.encode('utf-8'))
+        if self.size and self.size + length > self.max_bytes:
+            self._start_segment(self.number + 1)
+
+        record = self._index_record(entry, self.size, length)
+        self.handle.write(line)
+        self.index_handle.write(json.dumps(record) + '\n')
+        self.size += length
+        if self.records is not None:
+            self._remember(self.number, record)
+
+    def _migrate(self):
+        """One-time conversion of the legacy JSON array log into segments"""
+        with open(self.legacy_file, 'r') as f:
+            entries = json.load(f)
+
+        self._start_segment(1)
+        try:
+            for entry in entries:
+                self._write(entry)
+        finally:
+            self.handle.close()
+            self.index_handle.close()
+            self.handle = None
+            self.index_handle = None
+
+        os.replace(self.legacy_file, self.legacy_file + '.migrated')
+        logger.info(f"Migrated {len(entries)} log entries from {self.legacy_file} to {self.directory}")
+
+    def append(self, entry):
+        """Append one entry to the active segment"""
+        with self.lock:
+            if self.handle is None:
+                self._open()
+            self._write(entry)
+            self.handle.flush()
+            self.index_handle.flush()
+
+    # ---- History index ----
+
+    @staticmethod
+    def entry_files(details):
+        """Vault-relative paths of the files a log entry touched"""
+        if not isinstance(details, dict):
+            return []
+        files = []
+        for modification in details.get('modifications') or []:
+            if isinstance(modification, dict) and modification.get('file'):
+                files.append(modification['file'])
+        files.extend(details.get('files') or [])
+        if details.get('target_file'):
+            files.append(normalize_vault_path(details['target_file']))
+        return sorted(set(files))
+
+    def _index_record(self, entry, offset, length):
+        details = entry.get('details')
+        backup_path = details.get('backup_path') if isinstance(details, dict) else None
+        return [offset, length, entry.get('timestamp'), entry.get('action'), backup_path,
+                self.entry_files(details)]
+
+    def _remember(self, number, record):
+        """Add an index record to the in-memory lookup tables"""
+        position = len(self.records)
+        self.records.append((number,) + tuple(record))
+        _, _, timestamp, action, backup_path, files = record
+        self.by_action.setdefault(action, []).append(position)
+        if backup_path:
+            self.by_backup.setdefault(backup_path, []).append(position)
+        for file_path in files:
+            self.by_file.setdefault(file_path, []).append(position)
+
+    def _load_history(self):
+        """Load every sidecar index, first indexing any entries it does not cover yet"""
+        self.records = []
+        self.by_file, self.by_backup, self.by_action = {}, {}, {}
+
+        for number, path in self.segments():
+            records = []
+            index_path = self.index_path(number)
+            if os.path.exists(index_path):
+                with open(index_path, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            records.append(json.loads(line))
+                        except ValueError:
+                            continue
+
+            covered = records[-1][0] + records[-1][1] if records else 0
+            if covered < os.path.getsize(path):
+                missing = self._index_segment(path, covered)
+                with open(index_path, 'a', encoding='utf-8') as f:
+                    for record in missing:
+                        f.write(json.dumps(record) + '\n')
+                records.extend(missing)
+
+            for record in records:
+                self._remember(number, record)
+
+    def _index_segment(self, path, offset):
+        """Build index records for the entries in a segment from offset onwards"""
+        records = []
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break  # Partially written last line
+                try:
+                    entry = json.loads(line)
+                    records.append(self._index_record(entry, offset, len(line)))
+                except ValueError:
+                    pass
+                offset += len(line)
+        return records
+
+    def _read_records(self, positions):
+        """Read the full entries for the given record positions"""
+        entries = []
+        handles = {}
+        try:
+            for position in positions:
+                number, offset, length = self.records[position][:3]
+                if number not in handles:
+                    handles[number] = open(self.segment_path(number), 'rb')
+                handle = handles[number]
+                handle.seek(offset)
+                entries.append(json.loads(handle.read(length)))
+        finally:
+            for handle in handles.values():
+                handle.close()
+        return entries
+
+    def history(self, action=None, since=None, until=None, file_path=None, backup_path=None,
+                limit=50, cursor=None):
+        """Page through log entries, newest first.
+
+        Filters are combined with AND. cursor is the next_cursor of the
+        previous page. Returns (entries, next_cursor).
+        """
+        with self.lock:
+            if self.handle is None:
+                self._open()
+            if self.records is None:
+                self._load_history()
+
+            # Start from the most selective key available
+            if file_path:
+                candidates = self.by_file.get(file_path, [])
+            elif backup_path:
+                candidates = self.by_backup.get(backup_path, [])
+            elif action:
+                candidates = self.by_action.get(action, [])
+            else:
+                candidates = range(len(self.records))
+
+            end = len(candidates)
+            if cursor is not None:
+                end = bisect.bisect_left(candidates, cursor)
+
+            matched = []
+            for i in range(end - 1, -1, -1):
+                position = candidates[i]
+                record = self.records[position]
+                timestamp = record[3] or ''
+                # Entries are appended in time order, so older ones can stop the scan
+                if since and timestamp < since:
+                    break
+                if until and timestamp > until:
+                    continue
+                if action and record[4] != action:
+                    continue
+                if backup_path and record[5] != backup_path:
+                    continue
+                if file_path and file_path not in record[6]:
+                    continue
+                matched.append(position)
+                if len(matched) > limit:
+                    break
+
+            page = matched[:limit]
+            next_cursor = page[-1] if len(matched) > limit else None
+            return self._read_records(page), next_cursor
+
+change_log = ChangeLog(LOG_DIR, legacy_file=LEGACY_LOG_FILE)
+
 def log_change(action, details):
     """Log changes to a file"""
     try:
-        # Read existing log
-        if os.path.exists(LOG_FILE):
-            with open(LOG_FILE, 'r') as f:
-                log = json.load(f)
-        else:
-            log = []
-        
-        # Add new entry
-        log.append({
+        change_log.append({
             'timestamp': datetime.now().isoformat(),
             'action': action,
             'details': details
         })
-        
-        # Write back
-        with open(LOG_FILE, 'w') as f:
-            json.dump(log, f, indent=2)
     except Exception as e:
         logger.error(f"Error writing to log: {e}")
 
+# ============== Frontmatter Index ==============
+
+class FrontmatterIndex:
+    """Process-wide cache of parsed frontmatter, keyed by file path.
+
+    Each entry remembers the (mtime, size) it was parsed at and a hash of
+    the frontmatter block, so lookups only re-read notes that changed on
+    disk since the last call, and only re-parse those whose block changed.
+
+    Alongside the entries it keeps an inverted index (property -> value ->
+    file ids) so selective conditions can be answered from posting sets
+    instead of evaluating every note.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.entries = {}
+        # Paths added, changed or dropped since the last VaultIndexStore flush
+        self.dirty = set()
+        # Inverted index state
+        self.ids = {}
+        self.paths = {}
+        self.next_id = 0
+        self.postings = {}
+        self.present = {}
+        self.sorted_values = {}
+        self.irregular = set()
+
+    def get(self, file_path):
+        """Return the frontmatter of a file, re-parsing it only if it changed"""
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            self.discard(file_path)
+            return None
+
+        key = (stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            entry = self.entries.get(file_path)
+        if entry is not None and entry[0] == key:
+            return entry[1]
+
+        block = read_frontmatter_text(file_path)
+        block_hash = content_digest(block) if block is not None else None
+        if entry is not None and entry[2] == block_hash:
+            # Only the body changed
+            frontmatter = entry[1]
+        else:
+            frontmatter = parse_frontmatter_text(block, file_path)
+        with self.lock:
+            self._unindex(file_path)
+            self.entries[file_path] = (key, frontmatter, block_hash)
+            self._index(file_path, frontmatter)
+            self.dirty.add(file_path)
+        return frontmatter
+
+    def discard(self, file_path):
+        """Forget a cached entry (file deleted, renamed or rewritten)"""
+        with self.lock:
+            self._unindex(file_path)
+            if self.entries.pop(file_path, None) is not None:
+                self.dirty.add(file_path)
+
+    def clear(self):
+        """Drop every cached entry"""
+        with self.lock:
+            self.dirty.update(self.entries)
+            self.entries.clear()
+            self.ids.clear()
+            self.paths.clear()
+            self.postings.clear()
+            self.present.clear()
+            self.sorted_values.clear()
+            self.irregular.clear()
+
+    def scan(self, root, paths=None):
+        """Return (file_path, frontmatter) for every note under root, refreshing stale entries.
+
+        paths, if given, is the already-known list of notes under root;
+        otherwise root is walked.
+        """
+        results = []
+        seen = set()
+
+        if paths is None:
+            paths = []
+            for dirpath, dirs, filenames in os.walk(root):
+                # Skip hidden directories
+                dirs[:] = [d for d in dirs if not d.startswith('.')]
+
+                for filename in filenames:
+                    if filename.endswith('.md'):
+                        paths.append(os.path.join(dirpath, filename))
+
+        for file_path in paths:
+            seen.add(file_path)
+            results.append((file_path, self.get(file_path)))
+
+        # Drop entries for notes that no longer exist under root
+        prefix = os.path.join(root, '')
+        with self.lock:
+            stale = [p for p in self.entries if p.startswith(prefix) and p not in seen]
+            for file_path in stale:
+                self.discard(file_path)
+
+        return results
+
+    def load(self, rows):
+        """Seed entries from (file_path, mtime_ns, size, block_hash, frontmatter) rows.
+
+        Loaded entries are revalidated by stat on first use like any other;
+        paths already cached are left alone as they are at least as fresh.
+        """
+        with self.lock:
+            for file_path, mtime_ns, size, block_hash, frontmatter in rows:
+                if file_path in self.entries:
+                    continue
+                self.entries[file_path] = ((mtime_ns, size), frontmatter, block_hash)
+                self._index(file_path, frontmatter)
+
+    def take_dirty(self):
+        """(file_path, entry or None) for every path changed since the last call"""
+        with self.lock:
+            changes = [(file_path, self.entries.get(file_path)) for file_path in self.dirty]
+            self.dirty.clear()
+        return changes
+
+    def peek(self, file_path):
+        """Return cached frontmatter without touching the file, parsing it on a miss.
+
+        Only safe while the vault watcher keeps the entries current.
+        """
+        with self.lock:
+            entry = self.entries.get(file_path)
+        if entry is not None:
+            return entry[1]
+        return self.get(file_path)
+
+    # ---- Inverted index maintenance ----
+
+    def _index(self, file_path, frontmatter):
+        """Add a file's property values to the posting sets"""
+        file_id = self.ids.get(file_path)
+        if file_id is None:
+            file_id = self.next_id
+            self.next_id += 1
+            self.ids[file_path] = file_id
+            self.paths[file_id] = file_path
+
+        if not frontmatter:
+            return
+        if not isinstance(frontmatter, dict):
+            # Odd YAML (a bare string or list) is always evaluated by scanning
+            self.irregular.add(file_id)
+            return
+
+        for prop, prop_value in frontmatter.items():
+            if prop_value is None or prop_value == '' or (isinstance(prop_value, list) and len(prop_value) == 0):
+                pass
+            else:
+                self.present.setdefault(prop, set()).add(file_id)
+
+            values = self.postings.setdefault(prop, {})
+            for value in self._normalized_values(prop_value):
+                if value not in values:
+                    values[value] = set()
+                    self.sorted_values.pop(prop, None)
+                values[value].add(file_id)
+
+    def _unindex(self, file_path):
+        """Remove a file's property values from the posting sets"""
+        file_id = self.ids.get(file_path)
+        entry = self.entries.get(file_path)
+        if file_id is None or entry is None:
+            return
+
+        frontmatter = entry[1]
+        self.irregular.discard(file_id)
+        if not isinstance(frontmatter, dict):
+            return
+
+        for prop, prop_value in frontmatter.items():
+            present = self.present.get(prop)
+            if present is not None:
+                present.discard(file_id)
+            values = self.postings.get(prop, {})
+            for value in self._normalized_values(prop_value):
+                ids = values.get(value)
+                if ids is None:
+                    continue
+                ids.discard(file_id)
+                if not ids:
+                    del values[value]
+                    self.sorted_values.pop(prop, None)
+
+    @staticmethod
+    def _normalized_values(prop_value):
+        """Values as conditions compare them: str() of the value or of each list item"""
+        if isinstance(prop_value, list):
+            return {str(item) for item in prop_value}
+        return {str(prop_value)}
+
+    def _prefix_ids(self, prop, prefix):
+        """Union of posting sets for every value of prop starting with prefix"""
+        values = self.postings.get(prop)
+        if not values:
+            return set()
+
+        sorted_values = self.sorted_values.get(prop)
+        if sorted_values is None:
+            sorted_values = sorted(values)
+            self.sorted_values[prop] = sorted_values
+
+        result = set()
+        for i in range(bisect.bisect_left(sorted_values, prefix), len(sorted_values)):
+            value = sorted_values[i]
+            if not value.startswith(prefix):
+                break
+            result |= values[value]
+        return result
+
+    def lookup(self, condition):
+        """Return the ids matching a condition from the index, or None if it needs a scan"""
+        property_name = condition['property']
+        operator = condition['operator']
+        value = condition.get('value', '')
+
+        if operator == 'exists':
+            return self.present.get(property_name, set())
+        if operator not in ('equals', 'contains', 'startsWith', 'endsWith'):
+            return None
+        if not isinstance(value, str):
+            return None
+
+        if '*' in value:
+            # Wildcards only ever match with 'equals'; a single trailing * is a prefix lookup
+            if operator != 'equals':
+                return set()
+            if value.index('*') == len(value) - 1:
+                return self._prefix_ids(property_name, value[:-1])
+            return None
+
+        if operator == 'equals':
+            return set(self.postings.get(property_name, {}).get(value, ()))
+        if operator == 'startsWith':
+            return self._prefix_ids(property_name, value)
+        # contains / endsWith need a scan
+        return None
+
+    # ---- Query execution ----
+
+    def select(self, plan, file_paths):
+        """Return the subset of file_paths whose frontmatter satisfies a parsed query plan"""
+        with self.lock:
+            candidates = {self.ids[p] for p in file_paths if p in self.ids}
+            matched = self._resolve(plan, candidates)
+            return {self.paths[file_id] for file_id in matched}
+
+    def _frontmatter_of(self, file_id):
+        entry = self.entries.get(self.paths[file_id])
+        return entry[1] if entry else None
+
+    def _scan(self, predicate, candidates):
+        return {i for i in candidates if predicate(self._frontmatter_of(i))}
+
+    def _resolve(self, node, candidates):
+        """Evaluate a plan node against a candidate id set using posting-set algebra"""
+        kind = node[0]
+
+        if kind == 'condition':
+            condition, predicate = node[1], node[2]
+            irregular = self.irregular & candidates
+
+            if condition['operator'] == 'notExists':
+                result = candidates - self.present.get(condition['property'], set()) - irregular
+                return result | self._scan(predicate, irregular)
+
+            hits = self.lookup(condition)
+            if hits is None:
+                return self._scan(predicate, candidates)
+            return (hits & candidates) | self._scan(predicate, irregular)
+
+        if kind == 'not':
+            return candidates - self._resolve(node[1], candidates)
+
+        if kind == 'and':
+            # Resolve indexable children first so scans only see the survivors
+            children = sorted(node[1], key=self._scan_cost)
+            result = candidates
+            for child in children:
+                if not result:
+                    break
+                result = self._resolve(child, result)
+            return result
+
+        if kind == 'or':
+            result = set()
+            remaining = candidates
+            for child in node[1]:
+                if not remaining:
+                    break
+                hits = self._resolve(child, remaining)
+                result |= hits
+                remaining = remaining - hits
+            return result
+
+        raise ValueError(f"Unknown plan node: {kind}")
+
+    def _scan_cost(self, node):
+        """Rough ordering key: 0 for index-only nodes, 1 for nodes that need a scan"""
+        kind = node[0]
+        if kind == 'condition':
+            condition = node[1]
+            if condition['operator'] == 'notExists':
+                return 0
+            return 0 if self.lookup(condition) is not None else 1
+        if kind == 'not':
+            return self._scan_cost(node[1])
+        return max((self._scan_cost(child) for child in node[1]), default=0)
+
+frontmatter_index = FrontmatterIndex()
+
+# ============== Vault Watcher ==============
+
+class VaultTree:
+    """Folder tree and note listing of the vault, kept current by VaultWatcher.
+
+    Maps every (non-hidden) directory under the root to its subdirectory
+    names, .md file names and mtime, so listings never need to walk the
+    disk; without a watcher, revalidate() re-lists only changed directories.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.root = None
+        self.dirs = {}
+        # Set whenever dirs changes, cleared by take_snapshot()
+        self.changed = False
+
+    def covers(self, path):
+        """True if path lies inside the tree's root"""
+        if self.root is None or not path:
+            return False
+        path = os.path.normpath(path)
+        return path == self.root or path.startswith(self.root + os.sep)
+
+    def build(self, root):
+        """List the whole tree under root, returning every note found"""
+        root = os.path.normpath(root)
+        dirs = {}
+        files = self._list_tree(root, dirs)
+        with self.lock:
+            self.root = root
+            self.dirs = dirs
+            self.changed = True
+        return files
+
+    def load(self, root, dirs):
+        """Adopt a previously saved tree; call revalidate() before trusting it"""
+        with self.lock:
+            self.root = os.path.normpath(root)
+            self.dirs = dirs
+            self.changed = False
+
+    def take_snapshot(self):
+        """(root, copy of dirs) if the tree changed since the last call, else None"""
+        with self.lock:
+            if not self.changed or self.root is None:
+                return None
+            self.changed = False
+            return self.root, {path: dict(entry) for path, entry in self.dirs.items()}
+
+    @staticmethod
+    def _scan_dir(directory):
+        """Entry for one directory level, or None if it cannot be listed.
+
+        os.scandir reports entry types from the directory itself, so no
+        per-entry stat is needed. Symlinked directories are not followed,
+        like os.walk. The directory's mtime is taken before listing, so a
+        change made during the listing is seen by the next revalidate().
+        """
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+            subdirs = set()
+            notes = set()
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        # Skip hidden directories
+                        if not entry.name.startswith('.'):
+                            subdirs.add(entry.name)
+                    elif entry.name.endswith('.md'):
+                        notes.add(entry.name)
+        except OSError:
+            return None
+        return {'subdirs': subdirs, 'files': notes, 'mtime': mtime}
+
+    def _list_tree(self, directory, dirs):
+        """List directory and its subdirectories into dirs, returning the notes found"""
+        files = []
+        stack = [directory]
+        while stack:
+            current = stack.pop()
+            entry = self._scan_dir(current)
+            if entry is None:
+                continue
+            files.extend(os.path.join(current, name) for name in entry['files'])
+            stack.extend(os.path.join(current, name) for name in entry['subdirs'])
+            dirs[current] = entry
+        return files
+
+    def _drop_tree(self, directory):
+        """Forget directory and everything below it, returning the notes dropped"""
+        removed = []
+        stack = [directory]
+        while stack:
+            current = stack.pop()
+            entry = self.dirs.pop(current, None)
+            if entry is None:
+                continue
+            removed.extend(os.path.join(current, name) for name in entry['files'])
+            stack.extend(os.path.join(current, name) for name in entry['subdirs'])
+        return removed
+
+    def _is_hidden(self, directory):
+        relative = os.path.relpath(directory, self.root)
+        return relative != '.' and any(part.startswith('.') for part in relative.split(os.sep))
+
+    def knows(self, path):
+        """True if path is a directory or note currently in the tree"""
+        with self.lock:
+            if path in self.dirs:
+                return True
+            entry = self.dirs.get(os.path.dirname(path))
+            return entry is not None and os.path.basename(path) in entry['files']
+
+    def refresh_dir(self, directory):
+        """Re-list one directory after a change.
+
+        Returns (added_notes, removed_notes, added_dirs); new subdirectories
+        are listed recursively and vanished ones are dropped with their notes.
+        """
+        directory = os.path.normpath(directory)
+        with self.lock:
+            if not self.covers(directory) or self._is_hidden(directory):
+                return [], [], []
+            self.changed = True
+
+            parent = self.dirs.get(os.path.dirname(directory))
+            name = os.path.basename(directory)
+
+            if not os.path.isdir(directory):
+                if parent is not None and directory != self.root:
+                    parent['subdirs'].discard(name)
+                return [], self._drop_tree(directory), []
+
+            old = self.dirs.get(directory)
+            if old is None:
+                # A directory we have not seen yet: list it with everything below
+                new_dirs = {}
+                added = self._list_tree(directory, new_dirs)
+                self.dirs.update(new_dirs)
+                if parent is not None and directory != self.root:
+                    parent['subdirs'].add(name)
+                return added, [], list(new_dirs)
+
+            new_dirs = {}
+            self._list_tree_level(directory, new_dirs)
+            entry = new_dirs[directory]
+
+            added = [os.path.join(directory, n) for n in entry['files'] - old['files']]
+            removed = [os.path.join(directory, n) for n in old['files'] - entry['files']]
+            added_dirs = []
+
+            for subdir in old['subdirs'] - entry['subdirs']:
+                removed.extend(self._drop_tree(os.path.join(directory, subdir)))
+            for subdir in entry['subdirs'] - old['subdirs']:
+                sub_dirs = {}
+                added.extend(self._list_tree(os.path.join(directory, subdir), sub_dirs))
+                self.dirs.update(sub_dirs)
+                added_dirs.extend(sub_dirs)
+
+            self.dirs[directory] = entry
+            return added, removed, added_dirs
+
+    def _list_tree_level(self, directory, dirs):
+        """List a single directory level into dirs"""
+        dirs[directory] = self._scan_dir(directory) or {'subdirs': set(), 'files': set(), 'mtime': None}
+
+    def revalidate(self, directory):
+        """Bring the tree under directory up to date without a watcher.
+
+        Adding, removing or renaming an entry changes its directory's mtime,
+        so only directories whose mtime moved are re-listed; the rest cost
+        one stat each.
+        """
+        directory = os.path.normpath(directory)
+        with self.lock:
+            if directory not in self.dirs:
+                self.refresh_dir(directory)
+            stack = [directory]
+            while stack:
+                current = stack.pop()
+                entry = self.dirs.get(current)
+                if entry is None:
+                    continue
+                try:
+                    mtime = os.stat(current).st_mtime_ns
+                except OSError:
+                    mtime = None
+                if mtime != entry['mtime']:
+                    self.refresh_dir(current)
+                    entry = self.dirs.get(current)
+                    if entry is None:
+                        continue
+                stack.extend(os.path.join(current, name) for name in entry['subdirs'])
+
+    def all_dirs(self):
+        with self.lock:
+            return list(self.dirs)
+
+    def md_files(self, directory):
+        """Full paths of every note under directory (files first, then subfolders, sorted)"""
+        files = []
+        with self.lock:
+            stack = [os.path.normpath(directory)]
+            while stack:
+                current = stack.pop()
+                entry = self.dirs.get(current)
+                if entry is None:
+                    continue
+                files.extend(os.path.join(current, name) for name in sorted(entry['files']))
+                stack.extend(os.path.join(current, name) for name in sorted(entry['subdirs'], reverse=True))
+        return files
+
+    def folders(self, directory):
+        """(full_path, name, level) for every folder below directory, depth first"""
+        folders = []
+        with self.lock:
+            stack = [(os.path.normpath(directory), -1)]
+            while stack:
+                current, level = stack.pop()
+                entry = self.dirs.get(current)
+                if entry is None:
+                    continue
+                if level >= 0:
+                    folders.append((current, os.path.basename(current), level))
+                stack.extend((os.path.join(current, name), level + 1) for name in sorted(entry['subdirs'], reverse=True))
+        return folders
+
+vault_tree = VaultTree()
+
+def apply_vault_changes(paths):
+    """Push a batch of changed paths into the folder tree and frontmatter index.
+
+    Returns the directories that appeared, so the watcher can watch them.
+    """
+    dirs_to_list = set()
+    for path in paths:
+        # Created, deleted or renamed entries change their parent's listing
+        if os.path.exists(path) != vault_tree.knows(path):
+            dirs_to_list.add(os.path.dirname(path))
+        if os.path.isdir(path):
+            dirs_to_list.add(path)
+
+    added_dirs = []
+    changed_notes = set()
+    for directory in sorted(dirs_to_list):
+        added, removed, new_dirs = vault_tree.refresh_dir(directory)
+        for file_path in removed:
+            frontmatter_index.discard(file_path)
+            trigram_index.discard(file_path)
+            full_text_index.discard(file_path)
+        changed_notes.update(added)
+        added_dirs.extend(new_dirs)
+
+    # Modified notes: re-parse only if mtime/size actually changed
+    changed_notes.update(path for path in paths if path.endswith('.md') and vault_tree.knows(path))
+    for file_path in changed_notes:
+        frontmatter_index.get(file_path)
+        # Only maintain the content indexes once a search has built them
+        if trigram_index.file_ids:
+            trigram_index.refresh(file_path)
+        if full_text_index.files:
+            full_text_index.refresh(file_path)
+    full_text_index.commit()
+
+    return added_dirs
+
+# inotify constants (see inotify(7))
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+              IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+
+class VaultWatcher:
+    """Background thread that keeps vault_tree and frontmatter_index current.
+
+    Uses inotify on Linux and falls back to polling elsewhere (e.g. macOS).
+    Bursts of events, such as Obsidian's autosave, are debounced into one
+    batch before being applied.
+    """
+
+    DEBOUNCE_SECONDS = 0.5
+    POLL_INTERVAL = 2.0
+
+    def __init__(self, root):
+        self.root = os.path.normpath(root)
+        self.stop_event = threading.Event()
+        self.ready = threading.Event()
+        self.thread = None
+        self.pending = set()
+        self.last_event = 0.0
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+
+    def is_live(self):
+        """True once the initial build finished and the watcher is still running"""
+        return (self.ready.is_set() and not self.stop_event.is_set()
+                and self.thread is not None and self.thread.is_alive())
+
+    def run(self):
+        try:
+            self.build()
+            try:
+                self.run_inotify()
+            except (OSError, AttributeError) as e:
+                logger.info(f"inotify unavailable ({e}), polling vault every {self.POLL_INTERVAL}s")
+                self.run_polling()
+        except Exception as e:
+            logger.error(f"Vault watcher stopped: {e}")
+
+    def build(self):
+        """Initial full listing and parse; the only walk of the vault"""
+        start = time.monotonic()
+        if vault_tree.root == self.root:
+            # Warm start from a saved tree: only changed directories are re-listed
+            vault_tree.revalidate(self.root)
+            files = vault_tree.md_files(self.root)
+        else:
+            files = vault_tree.build(self.root)
+        # Revalidates saved entries by stat and drops those of deleted notes
+        frontmatter_index.scan(self.root, files)
+        self.ready.set()
+        logger.info(f"Vault index built: {len(files)} notes in {time.monotonic() - start:.2f}s")
+
+    def queue(self, path):
+        self.pending.add(path)
+        self.last_event = time.monotonic()
+
+    def flush(self, force=False):
+        """Apply pending changes once events have been quiet for DEBOUNCE_SECONDS"""
+        if not self.pending:
+            return []
+        if not force and time.monotonic() - self.last_event < self.DEBOUNCE_SECONDS:
+            return []
+        batch, self.pending = self.pending, set()
+        return apply_vault_changes(batch)
+
+    def run_inotify(self):
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        fd = libc.inotify_init1(os.O_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+
+        watches = {}
+
+        def add_watch(directory):
+            wd = libc.inotify_add_watch(fd, os.fsencode(directory), WATCH_MASK)
+            if wd >= 0:
+                # A moved directory keeps its wd; remap it to the new path
+                watches[wd] = directory
+
+        try:
+            for directory in vault_tree.all_dirs():
+                add_watch(directory)
+
+            header = struct.Struct('iIII')
+            while not self.stop_event.is_set():
+                readable, _, _ = select.select([fd], [], [], self.DEBOUNCE_SECONDS)
+                if readable:
+                    buffer = os.read(fd, 64 * 1024)
+                    offset = 0
+                    while offset < len(buffer):
+                        wd, mask, _, length = header.unpack_from(buffer, offset)
+                        name = buffer[offset + header.size:offset + header.size + length].rstrip(b'\0')
+                        offset += header.size + length
+
+                        if mask & IN_Q_OVERFLOW:
+                            # Events were lost: fall back to one full rebuild
+                            self.pending.clear()
+                            self.build()
+                            for directory in vault_tree.all_dirs():
+                                add_watch(directory)
+                            continue
+                        if mask & IN_IGNORED:
+                            watches.pop(wd, None)
+                            continue
+
+                        directory = watches.get(wd)
+                        if directory is None:
+                            continue
+                        self.queue(os.path.join(directory, os.fsdecode(name)) if name else directory)
+
+                for directory in self.flush():
+                    add_watch(directory)
+        finally:
+            os.close(fd)
+
+    def snapshot(self):
+        """(mtime, size) of every folder and note under the root"""
+        state = {}
+        for dirpath, dirs, filenames in os.walk(self.root):
+            dirs[:] = [d for d in dirs if not d.startswith('.')]
+            for name in dirs + [f for f in filenames if f.endswith('.md')]:
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                state[path] = (stat.st_mtime_ns, stat.st_size)
+        return state
+
+    def run_polling(self):
+        previous = self.snapshot()
+        while not self.stop_event.wait(self.POLL_INTERVAL):
+            current = self.snapshot()
+            for path in previous.keys() | current.keys():
+                if previous.get(path) != current.get(path):
+                    self.queue(path)
+            previous = current
+            self.flush(force=True)
+
+vault_watcher = None
+
+def start_vault_watcher(root):
+    """(Re)start background indexing and watching of the vault at root"""
+    global vault_watcher
+    if vault_watcher is not None:
+        vault_watcher.stop()
+    vault_index_store.attach(root)
+    vault_watcher = VaultWatcher(root).start()
+    return vault_watcher
+
+def vault_is_watched(path):
+    """True if listings under path can be served from the watched vault tree"""
+    return vault_watcher is not None and vault_watcher.is_live() and vault_tree.covers(path)
+
+def vault_tree_serves(path):
+    """True if listings under path can be served from vault_tree.
+
+    Without a live watcher the tree is built on first use (rooted at the
+    vault when path lies inside it) and revalidated by directory mtimes
+    before each listing.
+    """
+    if not path or not os.path.isdir(path):
+        return False
+    if vault_is_watched(path):
+        return True
+    path = os.path.normpath(path)
+    with vault_tree.lock:
+        if vault_watcher is not None and vault_watcher.is_live():
+            # The tree belongs to the watcher; do not re-root it
+            return False
+        if not vault_tree.covers(path):
+            vault_root = os.path.normpath(VAULT_PATH)
+            inside_vault = path == vault_root or path.startswith(vault_root + os.sep)
+            vault_tree.build(vault_root if inside_vault else path)
+        if vault_tree._is_hidden(path):
+            return False
+        vault_tree.revalidate(path)
+    return True
+
+def list_vault_notes(root):
+    """(file_path, frontmatter) for every note under root.
+
+    Served from the watched tree and cache when possible, otherwise from the
+    revalidated tree (or a walk of root), revalidating each note's mtime/size.
+    """
+    if vault_is_watched(root):
+        return [(file_path, frontmatter_index.peek(file_path)) for file_path in vault_tree.md_files(root)]
+    if vault_tree_serves(root):
+        return frontmatter_index.scan(root, vault_tree.md_files(root))
+    return frontmatter_index.scan(root)
+
 def get_md_files(directory, base_dir=None):
     """Recursively get all .md files in a directory"""
     if base_dir is None:
         base_dir = directory
     
+    if vault_tree_serves(directory):
+        # Tree paths are normalized, so most relative paths are a plain slice (relpath is slow in bulk)
+        prefix = os.path.join(os.path.normpath(base_dir), '')
+        return [{
+            'fullPath': full_path,
+            'relativePath': full_path[len(prefix):] if full_path.startswith(prefix) else os.path.relpath(full_path, base_dir),
+            'fileName': os.path.basename(full_path)
+        } for full_path in vault_tree.md_files(directory)]
+    
     files = []
     
     for root, dirs, filenames in os.walk(directory):
@@ -271,44 +2017,600 @@ def get_md_files(directory, base_dir=None):
     
     return files
 
+# ============== Persistent Vault Index ==============
+
+class VaultIndexStore:
+    """SQLite copy of frontmatter_index and vault_tree for one vault.
+
+    Keeps each note's mtime, size, frontmatter hash and pickled frontmatter,
+    and each folder's mtime and listing. attach() loads them back on startup;
+    the watcher then revalidates everything by stat instead of re-parsing the
+    vault. A background thread writes only what changed since the last flush.
+    """
+
+    SCHEMA_VERSION = '1'
+
+    def __init__(self, path):
+        self.path = path
+        self.root = None
+        # Set when the database holds another vault (or an old schema)
+        self.reset = False
+        self.flush_lock = threading.Lock()
+        self.thread = None
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=10)
+        db.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, hash TEXT, frontmatter BLOB);
+            CREATE TABLE IF NOT EXISTS dirs (
+                path TEXT PRIMARY KEY, mtime_ns INTEGER, subdirs TEXT, files TEXT);
+        """)
+        return db
+
+    def attach(self, root):
+        """Persist the vault at root from now on, loading what was saved for it"""
+        with self.flush_lock:
+            root = os.path.normpath(root)
+            if root == self.root:
+                return
+            self.root = root
+            self.reset = True
+            if not os.path.exists(self.path):
+                return
+            start = time.monotonic()
+            try:
+                with closing(self._connect()) as db:
+                    meta = dict(db.execute('SELECT key, value FROM meta'))
+                    if meta.get('schema') != self.SCHEMA_VERSION or meta.get('vault_root') != root:
+                        return
+                    rows = [(path, mtime_ns, size, block_hash, pickle.loads(frontmatter))
+                            for path, mtime_ns, size, block_hash, frontmatter
+                            in db.execute('SELECT path, mtime_ns, size, hash, frontmatter FROM files')]
+                    dirs = {path: {'subdirs': set(json.loads(subdirs)), 'files': set(json.loads(files)), 'mtime': mtime_ns}
+                            for path, mtime_ns, subdirs, files
+                            in db.execute('SELECT path, mtime_ns, subdirs, files FROM dirs')}
+            except Exception as e:
+                logger.error(f"Error loading vault index {self.path}: {e}")
+                return
+            
+            frontmatter_index.load(rows)
+            if dirs and vault_tree.root != root:
+                vault_tree.load(root, dirs)
+            self.reset = False
+            logger.info(f"Vault index loaded: {len(rows)} notes, {len(dirs)} folders in {time.monotonic() - start:.2f}s")
+
+    def flush(self):
+        """Write changes since the last flush; everything under the root after a reset"""
+        with self.flush_lock:
+            if self.root is None:
+                return
+            prefix = os.path.join(self.root, '')
+            changes = frontmatter_index.take_dirty()
+            if self.reset:
+                with frontmatter_index.lock:
+                    changes = list(frontmatter_index.entries.items())
+            changes = [(path, entry) for path, entry in changes if path.startswith(prefix)]
+            tree = vault_tree.take_snapshot()
+            if tree is not None and tree[0] != self.root:
+                tree = None
+            if not changes and tree is None and not self.reset:
+                return
+            
+            try:
+                with closing(self._connect()) as db, db:
+                    if self.reset:
+                        db.execute('DELETE FROM files')
+                        db.execute('DELETE FROM dirs')
+                        db.executemany('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                                       [('schema', self.SCHEMA_VERSION), ('vault_root', self.root)])
+                    db.executemany('DELETE FROM files WHERE path = ?',
+                                   [(path,) for path, entry in changes if entry is None])
+                    db.executemany('INSERT OR REPLACE INTO files (path, mtime_ns, size, hash, frontmatter) VALUES (?, ?, ?, ?, ?)',
+                                   [(path, entry[0][0], entry[0][1], entry[2],
+                                     pickle.dumps(entry[1], pickle.HIGHEST_PROTOCOL))
+                                    for path, entry in changes if entry is not None])
+                    if tree is not None:
+                        db.execute('DELETE FROM dirs')
+                        db.executemany('INSERT INTO dirs (path, mtime_ns, subdirs, files) VALUES (?, ?, ?, ?)',
+                                       [(path, entry['mtime'], json.dumps(sorted(entry['subdirs'])), json.dumps(sorted(entry['files'])))
+                                        for path, entry in tree[1].items()])
+                self.reset = False
+            except Exception as e:
+                logger.error(f"Error saving vault index {self.path}: {e}")
+                # Try again on the next flush
+                with frontmatter_index.lock:
+                    frontmatter_index.dirty.update(path for path, entry in changes)
+                if tree is not None:
+                    vault_tree.changed = True
+
+    def start(self):
+        """Flush every INDEX_FLUSH_INTERVAL seconds in the background, and once more at exit"""
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+            atexit.register(self.flush)
+        return self
+
+    def run(self):
+        while True:
+            time.sleep(INDEX_FLUSH_INTERVAL)
+            self.flush()
+
+vault_index_store = VaultIndexStore(INDEX_DB_FILE)
+
+# ============== Content Trigram Index ==============
+
+class TrigramIndex:
+    """Inverted trigram index over note contents, used to prefilter searches.
+
+    A literal search term can only occur in notes containing all of its
+    trigrams, so only those candidates need to be read and matched. Postings
+    are sets of file ids, so unindexing a note is one removal per trigram;
+    each file keeps the trigram ids it contributed so a change can be
+    unindexed without the old content.
+    """
+
+    # Intersecting the rarest few trigrams is selective enough
+    MAX_LOOKUP_TRIGRAMS = 4
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.vocabulary = {}
+        self.postings = []
+        self.file_ids = {}
+        self.paths = {}
+        self.files = {}
+        self.next_file_id = 0
+
+    def refresh(self, file_path):
+        """(Re)index one note if its mtime/size changed"""
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            self.discard(file_path)
+            return
+
+        key = (stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            file_id = self.file_ids.get(file_path)
+            if file_id is not None and self.files[file_id][0] == key:
+                return
+
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                content = f.read()
+        except (OSError, UnicodeDecodeError):
+            # Unreadable notes can never match a content search either
+            content = ''
+        trigrams = {content[i:i + 3] for i in range(len(content) - 2)}
+
+        with self.lock:
+            self._remove(file_path)
+            file_id = self.file_ids.get(file_path)
+            if file_id is None:
+                file_id = self.next_file_id
+                self.next_file_id += 1
+                self.file_ids[file_path] = file_id
+                self.paths[file_id] = file_path
+
+            trigram_ids = array.array('I')
+            for trigram in trigrams:
+                trigram_id = self.vocabulary.get(trigram)
+                if trigram_id is None:
+                    trigram_id = len(self.postings)
+                    self.vocabulary[trigram] = trigram_id
+                    self.postings.append(set())
+                self.postings[trigram_id].add(file_id)
+                trigram_ids.append(trigram_id)
+            self.files[file_id] = (key, trigram_ids)
+
+    def _remove(self, file_path):
+        file_id = self.file_ids.get(file_path)
+        entry = self.files.pop(file_id, None) if file_id is not None else None
+        if entry is not None:
+            for trigram_id in entry[1]:
+                self.postings[trigram_id].discard(file_id)
+
+    def discard(self, file_path):
+        """Remove a note from the index"""
+        with self.lock:
+            self._remove(file_path)
+            file_id = self.file_ids.pop(file_path, None)
+            if file_id is not None:
+                del self.paths[file_id]
+
+    def clear(self):
+        with self.lock:
+            self.__init__()
+
+    def candidates(self, file_paths, pattern, validate=True):
+        """Subset of file_paths whose content may contain pattern.
+
+        Uses the literal runs between wildcards; returns None when none of
+        them is long enough to have a trigram. With validate=False (vault
+        watcher live) known notes are trusted instead of being stat'ed.
+        """
+        literals = [part for part in re.split(r'[*?]', pattern) if len(part) >= 3]
+        if not literals:
+            return None
+
+        for file_path in file_paths:
+            if validate or file_path not in self.file_ids:
+                self.refresh(file_path)
+
+        with self.lock:
+            trigram_ids = set()
+            for literal in literals:
+                for i in range(len(literal) - 2):
+                    trigram_id = self.vocabulary.get(literal[i:i + 3])
+                    if trigram_id is None:
+                        # No note contains this trigram
+                        return set()
+                    trigram_ids.add(trigram_id)
+
+            rarest = sorted(trigram_ids, key=lambda trigram_id: len(self.postings[trigram_id]))
+            ids = set(self.postings[rarest[0]])
+            for trigram_id in rarest[1:self.MAX_LOOKUP_TRIGRAMS]:
+                if not ids:
+                    break
+                ids.intersection_update(self.postings[trigram_id])
+
+            return {self.paths[file_id] for file_id in ids} & set(file_paths)
+
+trigram_index = TrigramIndex()
+
+# ============== Content Full-Text Index ==============
+
+class FullTextIndex:
+    """Optional SQLite FTS5 index of note lines, used by mode: "indexed" searches.
+
+    Every non-blank line is one row whose rowid is (file id << LINE_BITS) |
+    line index, so a note's rows are replaced with a single rowid range
+    delete. Like TrigramIndex it remembers the (mtime, size) each note was
+    indexed at and only re-reads notes that changed. It persists between runs
+    in FULL_TEXT_DB_FILE; if SQLite lacks FTS5, open() returns False and
+    callers fall back to scanning.
+    """
+
+    LINE_BITS = 24
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.RLock()
+        self.db = None
+        self.root = None
+        self.available = True
+        # file_path -> (file id, (mtime_ns, size))
+        self.files = {}
+        self.paths = {}
+        self.next_file_id = 0
+
+    def open(self, root):
+        """Open (creating if needed) the index for the vault at root; False if FTS5 is unavailable"""
+        root = os.path.normpath(root)
+        with self.lock:
+            if self.db is not None and self.root == root:
+                return True
+            if not self.available:
+                return False
+            self.close()
+            try:
+                db = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+                db.executescript("""
+                    CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+                    CREATE TABLE IF NOT EXISTS docs (
+                        path TEXT PRIMARY KEY, file_id INTEGER, mtime_ns INTEGER, size INTEGER);
+                    CREATE VIRTUAL TABLE IF NOT EXISTS lines USING fts5(
+                        text, tokenize = 'unicode61 remove_diacritics 0');
+                """)
+                meta = dict(db.execute('SELECT key, value FROM meta'))
+                if meta.get('vault_root') != root:
+                    with db:
+                        db.execute('DELETE FROM docs')
+                        db.execute('DELETE FROM lines')
+                        db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('vault_root', ?)", (root,))
+                for file_path, file_id, mtime_ns, size in db.execute('SELECT path, file_id, mtime_ns, size FROM docs'):
+                    self.files[file_path] = (file_id, (mtime_ns, size))
+                    self.paths[file_id] = file_path
+                    self.next_file_id = max(self.next_file_id, file_id + 1)
+            except sqlite3.Error as e:
+                logger.info(f"Full-text search unavailable ({e}), indexed searches will scan")
+                self.available = False
+                self.files.clear()
+                self.paths.clear()
+                return False
+            self.db = db
+            self.root = root
+            return True
+
+    def close(self):
+        """Close the index (e.g. when the vault changes); the next open() picks the new vault"""
+        with self.lock:
+            if self.db is not None:
+                self.db.close()
+            self.db = None
+            self.root = None
+            self.files.clear()
+            self.paths.clear()
+            self.next_file_id = 0
+
+    def _range(self, file_id):
+        return file_id << self.LINE_BITS, ((file_id + 1) << self.LINE_BITS) - 1
+
+    def refresh(self, file_path):
+        """(Re)index one note if its mtime/size changed; call commit() after a batch"""
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            self.discard(file_path)
+            return
+
+        key = (stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            if self.db is None:
+                return
+            known = self.files.get(file_path)
+            if known is not None and known[1] == key:
+                return
+
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                lines = f.read().split('\n')
+        except (OSError, UnicodeDecodeError):
+            # Unreadable notes can never match a content search either
+            lines = []
+
+        with self.lock:
+            if self.db is None:
+                return
+            known = self.files.get(file_path)
+            if known is not None and known[1] == key:
+                # Another request indexed it meanwhile
+                return
+            if known is not None:
+                file_id = known[0]
+                self.db.execute('DELETE FROM lines WHERE rowid BETWEEN ? AND ?', self._range(file_id))
+            else:
+                file_id = self.next_file_id
+                self.next_file_id += 1
+                self.paths[file_id] = file_path
+            first = file_id << self.LINE_BITS
+            self.db.executemany('INSERT INTO lines (rowid, text) VALUES (?, ?)', [
+                (first + i, line) for i, line in enumerate(lines[:1 << self.LINE_BITS])
+                if FULL_TEXT_TOKEN_PATTERN.search(line)
+            ])
+            self.db.execute('INSERT OR REPLACE INTO docs (path, file_id, mtime_ns, size) VALUES (?, ?, ?, ?)',
+                            (file_path, file_id, key[0], key[1]))
+            self.files[file_path] = (file_id, key)
+
+    def discard(self, file_path):
+        """Remove a note from the index; call commit() after a batch"""
+        with self.lock:
+            known = self.files.pop(file_path, None)
+            if known is None or self.db is None:
+                return
+            self.paths.pop(known[0], None)
+            self.db.execute('DELETE FROM lines WHERE rowid BETWEEN ? AND ?', self._range(known[0]))
+            self.db.execute('DELETE FROM docs WHERE path = ?', (file_path,))
+
+    def commit(self):
+        with self.lock:
+            if self.db is not None:
+                self.db.commit()
+
+    def indexed_key(self, file_path):
+        """(mtime_ns, size) the note was indexed at, or None"""
+        with self.lock:
+            known = self.files.get(file_path)
+            return known[1] if known else None
+
+    def search(self, file_paths, expression, validate=True):
+        """{file_path: [line index, ...]} of lines in file_paths matching an FTS5 expression.
+
+        With validate=False (vault watcher live) notes already indexed are
+        trusted instead of being stat'ed; new ones are always indexed.
+        """
+        for file_path in file_paths:
+            if validate or file_path not in self.files:
+                self.refresh(file_path)
+        self.commit()
+
+        wanted = set(file_paths)
+        hits = {}
+        mask = (1 << self.LINE_BITS) - 1
+        with self.lock:
+            if self.db is None:
+                return hits
+            rows = self.db.execute('SELECT rowid FROM lines WHERE lines MATCH ? ORDER BY rowid', (expression,))
+            for (rowid,) in rows:
+                file_path = self.paths.get(rowid >> self.LINE_BITS)
+                if file_path in wanted:
+                    hits.setdefault(file_path, []).append(rowid & mask)
+        return hits
+
+# Characters the unicode61 tokenizer keeps in a token (letters and digits, not '_')
+FULL_TEXT_TOKEN_PATTERN = re.compile(r'[^\W_]+')
+
+full_text_index = FullTextIndex(FULL_TEXT_DB_FILE)
+
 # ============== Search/Replace Functions ==============
 
-def wildcard_to_regex(pattern, multiline=False):
-    """Convert wildcard pattern to regex with optional multiline support"""
-    # Escape special regex characters except * and ?
-    escaped = re.escape(pattern)
-    # Replace wildcards
-    if multiline:
-        # In multiline mode, * can match across lines
-        escaped = escaped.replace(r'\*', '(?:.|\\n)*')
-        escaped = escaped.replace(r'\?', '(?:.|\\n)')
-    else:
-        escaped = escaped.replace(r'\*', '.*')
-        escaped = escaped.replace(r'\?', '.')
+class GlobSegment:
+    """A wildcard-free piece of a glob pattern; '?' matches any single character"""
+    
+    def __init__(self, text):
+        self.text = text
+        self.length = len(text)
+        # Fixed-length regex for '?' segments; plain str methods otherwise
+        self.regex = re.compile(re.escape(text).replace(r'\?', '.'), re.DOTALL) if '?' in text else None
+    
+    def match_at(self, text, pos):
+        if self.regex is None:
+            return text.startswith(self.text, pos)
+        return self.regex.match(text, pos) is not None
+    
+    def find(self, text, start, end):
+        """Leftmost start index of the segment within text[start:end], or -1"""
+        if self.regex is None:
+            return text.find(self.text, start, end)
+        match = self.regex.search(text, start, end)
+        return match.start() if match else -1
+
+class GlobPattern:
+    """Wildcard pattern matched without backtracking.
+
+    The pattern is split on '*' into fixed-length segments. The first and last
+    segments are anchored; the middle ones are located left to right, each at
+    its leftmost occurrence, which is always a valid choice for a full match.
+    Matching is therefore linear in the text for literal segments.
+    """
+    
+    def __init__(self, pattern, multiline=False):
+        self.multiline = multiline
+        # Without multiline, wildcards never cross line breaks, so each line
+        # of the pattern has to match the corresponding line of the text
+        lines = [pattern] if multiline else pattern.split('\n')
+        self.lines = [[GlobSegment(part) for part in line.split('*')] for line in lines]
+    
+    def _fullmatch_line(self, segments, text, start, end, spans=None):
+        """Match text[start:end]; with wikilink spans, no literal segment may overlap a wikilink"""
+        first = segments[0]
+        if len(segments) == 1:
+            return (end - start == first.length and first.match_at(text, start)
+                    and not (spans and first.length and overlaps_wikilink(spans, start, end)))
+        
+        last = segments[-1]
+        tail = end - last.length
+        if tail < start + first.length or not first.match_at(text, start) or not last.match_at(text, tail):
+            return False
+        if spans and ((first.length and overlaps_wikilink(spans, start, start + first.length))
+                      or (last.length and overlaps_wikilink(spans, tail, end))):
+            return False
+        
+        pos = start + first.length
+        for segment in segments[1:-1]:
+            index = segment.find(text, pos, tail)
+            # The leftmost occurrence clear of wikilinks is still the best choice
+            while spans and segment.length and index != -1 and overlaps_wikilink(spans, index, index + segment.length):
+                index = segment.find(text, index + 1, tail)
+            if index == -1:
+                return False
+            pos = index + segment.length
+        return True
     
-    # Add flags for multiline matching if needed
-    flags = re.DOTALL if multiline else 0
-    return re.compile('^' + escaped + '$', flags)
+    def _fullmatch(self, text, spans=None):
+        if self.multiline:
+            return self._fullmatch_line(self.lines[0], text, 0, len(text), spans)
+        
+        text_lines = text.split('\n')
+        if len(text_lines) != len(self.lines):
+            return False
+        start = 0
+        for segments, line in zip(self.lines, text_lines):
+            end = start + len(line)
+            if not self._fullmatch_line(segments, text, start, end, spans):
+                return False
+            start = end + 1
+        return True
+    
+    def match_end(self, text, spans=None):
+        """End of the match if the whole text matches, else None.
+
+        Like an anchored regex ending in '$', a single trailing line break
+        may be left out of the match. With wikilink spans (see
+        find_wikilink_spans), wildcards may run across wikilinks but the
+        pattern's literal parts may not match inside one.
+        """
+        if spans is not None and not spans[0]:
+            spans = None
+        if self._fullmatch(text, spans):
+            return len(text)
+        if text.endswith('\n') and self._fullmatch(text[:-1], spans):
+            return len(text) - 1
+        return None
+
+@functools.lru_cache(maxsize=256)
+def compile_wildcard(pattern, multiline=False):
+    """Compiled (cached) wildcard pattern"""
+    return GlobPattern(pattern, multiline)
 
-def matches_wildcard(text, pattern, multiline=False):
-    """Check if string matches wildcard pattern (case sensitive)"""
-    regex = wildcard_to_regex(pattern, multiline)
-    return regex.match(text) is not None
+def matches_wildcard(text, pattern, multiline=False, wikilink_spans=None):
+    """Check if string matches wildcard pattern (case sensitive), optionally outside wikilinks"""
+    return compile_wildcard(pattern, multiline).match_end(text, wikilink_spans) is not None
 
 def replace_with_wildcard(text, search_pattern, replace_pattern, multiline=False):
     """Replace wildcards in string"""
-    regex = wildcard_to_regex(search_pattern, multiline)
-    matches = regex.match(text)
+    match_end = compile_wildcard(search_pattern, multiline).match_end(text)
     
-    if not matches:
+    if match_end is None:
+        return text
+    
+    # Simple replacement without wildcard capturing
+    if '*' not in search_pattern and '?' not in search_pattern:
+        return text.replace(search_pattern, replace_pattern)
+    
+    # For wildcards, do a simple replacement of the entire match
+    return replace_pattern + text[match_end:]
+
+WIKILINK_PATTERN = re.compile(r'\[\[([^\]]+)\]\]')
+
+def find_wikilink_spans(text):
+    """Sorted, non-overlapping (starts, ends) of the wikilinks in text"""
+    starts = []
+    ends = []
+    for match in WIKILINK_PATTERN.finditer(text):
+        starts.append(match.start())
+        ends.append(match.end())
+    return starts, ends
+
+def starts_in_wikilink(spans, pos):
+    """True if the character at pos lies inside a wikilink"""
+    starts, ends = spans
+    index = bisect.bisect_right(starts, pos) - 1
+    return index >= 0 and pos < ends[index]
+
+def overlaps_wikilink(spans, start, end):
+    """True if text[start:end] overlaps any wikilink"""
+    starts, ends = spans
+    # First wikilink ending after start; it overlaps if it begins before end
+    index = bisect.bisect_right(ends, start)
+    return index < len(starts) and starts[index] < end
+
+def text_outside_wikilinks(text, spans):
+    """(start, end) of each non-empty stretch of text between wikilinks"""
+    if not spans[0]:
+        # No wikilinks: the whole text, even if empty
+        return [(0, len(text))]
+    fragments = []
+    pos = 0
+    for start, end in zip(*spans):
+        if start > pos:
+            fragments.append((pos, start))
+        pos = end
+    if pos < len(text):
+        fragments.append((pos, len(text)))
+    return fragments
+
+def replace_wildcard_keeping_wikilinks(text, search_pattern, replacement, spans, multiline=False,
+                                       delete_trailing_linebreaks=False):
+    """Replace a wildcard match of text the way the search matched it, wikilinks left intact.
+
+    The match is the one matches_wildcard() finds with these wikilink spans,
+    so wildcards may run across wikilinks. The matched text becomes the
+    replacement followed by the wikilinks it contained, copied unchanged.
+    Returns text as is if the pattern doesn't match.
+    """
+    end = compile_wildcard(search_pattern, multiline).match_end(text, spans)
+    if end is None:
         return text
     
-    # Simple replacement without wildcard capturing
-    if '*' not in search_pattern and '?' not in search_pattern:
-        return text.replace(search_pattern, replace_pattern)
-    
-    # For wildcards, do a simple replacement of the entire match
-    return regex.sub(replace_pattern, text)
+    kept = ''.join(text[start:link_end] for start, link_end in zip(*spans) if link_end <= end)
+    after = text[end:]
+    if delete_trailing_linebreaks and after.startswith('\n'):
+        after = after[1:]
+    return replacement + kept + after
 
 def search_in_line_excluding_wikilinks(line, search_pattern, exclude_wikilinks=True):
     """Search for pattern in line, optionally excluding wikilinks"""
@@ -317,9 +2619,7 @@ def search_in_line_excluding_wikilinks(line, search_pattern, exclude_wikilinks=T
         return matches_wildcard(line, search_pattern) or search_pattern in line
     
     # Find all wikilinks in the line
-    wikilink_positions = []
-    for match in re.finditer(r'\[\[([^\]]+)\]\]', line):
-        wikilink_positions.append((match.start(), match.end()))
+    spans = find_wikilink_spans(line)
     
     # For simple patterns (no wildcards), check each occurrence
     if '*' not in search_pattern and '?' not in search_pattern:
@@ -331,31 +2631,16 @@ def search_in_line_excluding_wikilinks(line, search_pattern, exclude_wikilinks=T
                 break
             
             # Check if this occurrence is inside a wikilink
-            inside_wikilink = False
-            for wl_start, wl_end in wikilink_positions:
-                if wl_start <= pos < wl_end:
-                    inside_wikilink = True
-                    break
-            
-            if not inside_wikilink:
+            if not starts_in_wikilink(spans, pos):
                 return True
             
             start = pos + 1
         
         return False
     else:
-        # For wildcard patterns, we need to check the entire line
-        # but exclude wikilink portions
-        if matches_wildcard(line, search_pattern):
-            # If there are no wikilinks, it's a valid match
-            if not wikilink_positions:
-                return True
-            
-            # For now, return True for wildcard matches
-            # (this could be improved with more sophisticated logic)
-            return True
-        
-        return False
+        # For wildcard patterns, match the whole line, rejecting only
+        # matches whose literal parts fall inside a wikilink
+        return matches_wildcard(line, search_pattern, wikilink_spans=spans)
 
 def replace_in_line_excluding_wikilinks(line, search_pattern, replace_pattern, exclude_wikilinks=True):
     """Replace pattern in line, optionally excluding wikilinks"""
@@ -367,14 +2652,11 @@ def replace_in_line_excluding_wikilinks(line, search_pattern, replace_pattern, e
             return replace_with_wildcard(line, search_pattern, replace_pattern)
     
     # Find all wikilinks in the line
-    wikilink_positions = []
-    for match in re.finditer(r'\[\[([^\]]+)\]\]', line):
-        wikilink_positions.append((match.start(), match.end()))
+    spans = find_wikilink_spans(line)
     
     # For simple patterns (no wildcards)
     if '*' not in search_pattern and '?' not in search_pattern:
         result = line
-        offset = 0
         
         # Find all occurrences of the pattern
         start = 0
@@ -386,13 +2668,7 @@ def replace_in_line_excluding_wikilinks(line, search_pattern, replace_pattern, e
                 break
             
             # Check if this occurrence is inside a wikilink
-            inside_wikilink = False
-            for wl_start, wl_end in wikilink_positions:
-                if wl_start <= pos < wl_end:
-                    inside_wikilink = True
-                    break
-            
-            if not inside_wikilink:
+            if not starts_in_wikilink(spans, pos):
                 replacements.append(pos)
             
             start = pos + 1
@@ -403,12 +2679,8 @@ def replace_in_line_excluding_wikilinks(line, search_pattern, replace_pattern, e
         
         return result
     else:
-        # For wildcard patterns, return the original line if it contains wikilinks
-        # (This could be improved with more sophisticated logic)
-        if wikilink_positions:
-            return line
-        else:
-            return replace_with_wildcard(line, search_pattern, replace_pattern)
+        # For wildcard patterns, replace the same whole-line match the search finds
+        return replace_wildcard_keeping_wikilinks(line, search_pattern, replace_pattern, spans)
 
 def search_in_content_multiline(content, search_pattern, exclude_wikilinks=True):
     """Search for pattern in entire content (multiline)"""
@@ -418,9 +2690,7 @@ def search_in_content_multiline(content, search_pattern, exclude_wikilinks=True)
     
     # For excluding wikilinks, we need to be more careful
     # First, find all wikilink positions in the entire content
-    wikilink_positions = []
-    for match in re.finditer(r'\[\[([^\]]+)\]\]', content):
-        wikilink_positions.append((match.start(), match.end()))
+    spans = find_wikilink_spans(content)
     
     # For simple patterns (no wildcards)
     if '*' not in search_pattern and '?' not in search_pattern:
@@ -432,25 +2702,16 @@ def search_in_content_multiline(content, search_pattern, exclude_wikilinks=True)
                 break
             
             # Check if any part of this occurrence is inside a wikilink
-            match_end = pos + len(search_pattern)
-            inside_wikilink = False
-            
-            for wl_start, wl_end in wikilink_positions:
-                # Check if the match overlaps with the wikilink
-                if not (match_end <= wl_start or pos >= wl_end):
-                    inside_wikilink = True
-                    break
-            
-            if not inside_wikilink:
+            if not overlaps_wikilink(spans, pos, pos + len(search_pattern)):
                 return True
             
             start = pos + 1
         
         return False
     else:
-        # For wildcard patterns in multiline mode
-        # This is more complex - for now, we'll do a simpler check
-        return matches_wildcard(content, search_pattern, multiline=True)
+        # For wildcard patterns, match the whole content, rejecting only
+        # matches whose literal parts fall inside a wikilink
+        return matches_wildcard(content, search_pattern, multiline=True, wikilink_spans=spans)
 
 def replace_in_content_multiline(content, search_pattern, replace_pattern, exclude_wikilinks=True, delete_mode=False, delete_trailing_linebreaks=True):
     """Replace pattern in content (multiline)"""
@@ -465,14 +2726,11 @@ def replace_in_content_multiline(content, search_pattern, replace_pattern, exclu
             return replace_with_wildcard(content, search_pattern, replace_pattern, multiline=True)
     
     # Find all wikilinks in the content
-    wikilink_positions = []
-    for match in re.finditer(r'\[\[([^\]]+)\]\]', content):
-        wikilink_positions.append((match.start(), match.end()))
+    spans = find_wikilink_spans(content)
     
     # For simple patterns (no wildcards)
     if '*' not in search_pattern and '?' not in search_pattern:
         result = content
-        offset = 0
         replacements = []
         
         # Find all occurrences of the pattern
@@ -484,15 +2742,7 @@ def replace_in_content_multiline(content, search_pattern, replace_pattern, exclu
             
             # Check if any part of this occurrence is inside a wikilink
             match_end = pos + len(search_pattern)
-            inside_wikilink = False
-            
-            for wl_start, wl_end in wikilink_positions:
-                # Check if the match overlaps with the wikilink
-                if not (match_end <= wl_start or pos >= wl_end):
-                    inside_wikilink = True
-                    break
-            
-            if not inside_wikilink:
+            if not overlaps_wikilink(spans, pos, match_end):
                 replacements.append((pos, match_end))
             
             start = pos + 1
@@ -513,28 +2763,13 @@ def replace_in_content_multiline(content, search_pattern, replace_pattern, exclu
         
         return result
     else:
-        # For wildcard patterns, we need more sophisticated handling
-        # This is a simplified version - could be enhanced
-        if not wikilink_positions:
-            if delete_mode:
-                # For delete mode with wildcards, find the match and remove it
-                regex = wildcard_to_regex(search_pattern, multiline=True)
-                match = regex.search(content)
-                if match:
-                    start, end = match.span()
-                    before = content[:start]
-                    after = content[end:]
-                    
-                    if delete_trailing_linebreaks and after.startswith('\n'):
-                        after = after[1:]
-                    
-                    return before + after
-                return content
-            else:
-                return replace_with_wildcard(content, search_pattern, replace_pattern, multiline=True)
-        else:
-            # With wikilinks present, be more careful
-            return content  # Simplified for now
+        # For wildcard patterns, replace the same whole-content match the search finds
+        if delete_mode:
+            return replace_wildcard_keeping_wikilinks(
+                content, search_pattern, '', spans, multiline=True,
+                delete_trailing_linebreaks=delete_trailing_linebreaks
+            )
+        return replace_wildcard_keeping_wikilinks(content, search_pattern, replace_pattern, spans, multiline=True)
 
 def handle_delete_with_linebreaks(content, pattern):
     """Handle deletion of pattern with optional line break removal"""
@@ -566,195 +2801,1080 @@ def handle_delete_with_linebreaks(content, pattern):
     
     return result
 
-# ============== Query Tool Functions ==============
+def search_file(file_info, search_pattern, search_scope, exclude_wikilinks=True, multiline_mode=False):
+    """Search one file's name and/or content; returns its match info or None"""
+    match_info = {
+        'fullPath': file_info['fullPath'],
+        'relativePath': file_info['relativePath'],
+        'fileName': file_info['fileName'],
+        'matches': []
+    }
+    
+    # Search in filename
+    if search_scope in ['names', 'both']:
+        if matches_wildcard(file_info['fileName'], search_pattern, multiline=False):
+            match_info['matches'].append({
+                'type': 'filename',
+                'original': file_info['fileName'],
+                'lineNumber': None
+            })
+    
+    # Search in content
+    if search_scope in ['contents', 'both']:
+        try:
+            with open(file_info['fullPath'], 'r', encoding='utf-8') as f:
+                content = f.read()
+            
+            if multiline_mode:
+                # Search entire content at once
+                if search_in_content_multiline(content, search_pattern, exclude_wikilinks):
+                    # Find the actual match for display
+                    if '*' not in search_pattern and '?' not in search_pattern:
+                        # For literal patterns, show the exact match
+                        pos = content.find(search_pattern)
+                        if pos != -1:
+                            # Calculate line number of start
+                            line_num = content[:pos].count('\n') + 1
+                            match_info['matches'].append({
+                                'type': 'content',
+                                'original': search_pattern,
+                                'lineNumber': line_num
+                            })
+                    else:
+                        # For wildcard patterns, show that there's a match
+                        match_info['matches'].append({
+                            'type': 'content',
+                            'original': f'[Multiline wildcard match for: {search_pattern}]',
+                            'lineNumber': None
+                        })
+            else:
+                # Original line-by-line search
+                lines = content.split('\n')
+                for i, line in enumerate(lines):
+                    if search_in_line_excluding_wikilinks(line, search_pattern, exclude_wikilinks):
+                        match_info['matches'].append({
+                            'type': 'content',
+                            'original': line,
+                            'lineNumber': i + 1
+                        })
+        except Exception as e:
+            logger.error(f"Error reading file {file_info['fullPath']}: {e}")
+    
+    return match_info if match_info['matches'] else None
 
-def evaluate_condition(frontmatter, condition):
-    """Evaluate a single condition against frontmatter"""
-    property_name = condition['property']
-    operator = condition['operator']
-    value = condition.get('value', '')
+def search_files_chunk(files, search_pattern, search_scope, exclude_wikilinks, multiline_mode):
+    """Search a batch of files (runs inside a search worker process)"""
+    results = []
+    for file_info in files:
+        match_info = search_file(file_info, search_pattern, search_scope, exclude_wikilinks, multiline_mode)
+        if match_info:
+            results.append(match_info)
+    return results
+
+search_executor = None
+search_executor_workers = 0
+search_executor_lock = threading.Lock()
+
+def get_search_executor():
+    """Process pool for content searches, (re)created for the configured worker count"""
+    global search_executor, search_executor_workers
+    with search_executor_lock:
+        if search_executor is None or search_executor_workers != SEARCH_WORKERS:
+            if search_executor is not None:
+                search_executor.shutdown(wait=False)
+            # The pool is first needed on a request thread; forking there could copy
+            # a lock another thread holds, so workers are spawned fresh instead
+            search_executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=SEARCH_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+            search_executor_workers = SEARCH_WORKERS
+        return search_executor
+
+def iter_search_files(files, search_pattern, search_scope, exclude_wikilinks=True, multiline_mode=False,
+                      content_candidates=None):
+    """Search files, spreading chunks over SEARCH_WORKERS processes.
+
+    Yields match infos in the order of files as soon as each chunk is done,
+    regardless of which worker finishes first. With content_candidates (from
+    the trigram index) only those files have their content read; the others
+    are still checked by name if requested.
+    """
+    if content_candidates is not None:
+        candidate_files = [f for f in files if f['fullPath'] in content_candidates]
+        candidate_matches = iter_search_files(candidate_files, search_pattern, search_scope,
+                                              exclude_wikilinks, multiline_mode)
+        pending = next(candidate_matches, None)
+        for file_info in files:
+            if file_info['fullPath'] in content_candidates:
+                if pending is not None and pending['fullPath'] == file_info['fullPath']:
+                    yield pending
+                    pending = next(candidate_matches, None)
+            elif search_scope == 'both':
+                match_info = search_file(file_info, search_pattern, 'names')
+                if match_info:
+                    yield match_info
+        return
     
-    # Handle 'exists' operator
-    if operator == 'exists':
-        if not frontmatter:
-            return False
-        # Property exists and has a non-empty value
-        if property_name not in frontmatter:
-            return False
-        prop_value = frontmatter[property_name]
-        # Check if value is not empty/null
-        if prop_value is None or prop_value == '' or (isinstance(prop_value, list) and len(prop_value) == 0):
-            return False
-        return True
+    if SEARCH_WORKERS <= 1 or len(files) < SEARCH_PARALLEL_MIN_FILES or search_scope == 'names':
+        for file_info in files:
+            match_info = search_file(file_info, search_pattern, search_scope, exclude_wikilinks, multiline_mode)
+            if match_info:
+                yield match_info
+        return
     
-    # Handle 'notExists' operator
-    if operator == 'notExists':
-        # If no frontmatter at all, property doesn't exist
-        if not frontmatter:
-            return True
-        # Property doesn't exist or is empty/null
-        if property_name not in frontmatter:
-            return True
-        prop_value = frontmatter[property_name]
-        # Check if value is empty/null
-        if prop_value is None or prop_value == '' or (isinstance(prop_value, list) and len(prop_value) == 0):
-            return True
-        return False
+    chunks = [files[i:i + SEARCH_CHUNK_SIZE] for i in range(0, len(files), SEARCH_CHUNK_SIZE)]
+    done = 0
+    try:
+        executor = get_search_executor()
+        futures = [
+            executor.submit(search_files_chunk, chunk, search_pattern, search_scope, exclude_wikilinks, multiline_mode)
+            for chunk in chunks
+        ]
+        try:
+            for future in futures:
+                results = future.result()
+                done += 1
+                yield from results
+        finally:
+            # Client went away or a worker died: drop the queued chunks
+            for future in futures[done:]:
+                future.cancel()
+    except (OSError, concurrent.futures.process.BrokenProcessPool) as e:
+        logger.error(f"Parallel search unavailable, searching serially: {e}")
+        for chunk in chunks[done:]:
+            yield from search_files_chunk(chunk, search_pattern, search_scope, exclude_wikilinks, multiline_mode)
+
+def search_files(files, search_pattern, search_scope, exclude_wikilinks=True, multiline_mode=False,
+                 content_candidates=None):
+    """Search files and collect all match infos (see iter_search_files)"""
+    return list(iter_search_files(files, search_pattern, search_scope, exclude_wikilinks, multiline_mode,
+                                  content_candidates))
+
+def preview_file(file_info, content, search_pattern, replace_pattern, search_scope, exclude_wikilinks=True,
+                 multiline_mode=False, delete_mode=False, delete_trailing_linebreaks=True):
+    """Preview the changes a replace would make to one file; returns the preview or None.
+
+    content is the file's text, or None if it was not read.
+    """
+    preview = {
+        'fullPath': file_info['fullPath'],
+        'relativePath': file_info['relativePath'],
+        'fileName': file_info['fileName'],
+        'changes': []
+    }
+    
+    # Preview filename changes
+    if search_scope in ['names', 'both']:
+        if matches_wildcard(file_info['fileName'], search_pattern, multiline=False):
+            if delete_mode:
+                preview['changes'].append({
+                    'type': 'filename',
+                    'original': file_info['fileName'],
+                    'replacement': '[File will be renamed - pattern removed]'
+                })
+            else:
+                new_name = replace_with_wildcard(file_info['fileName'], search_pattern, replace_pattern, multiline=False)
+                preview['changes'].append({
+                    'type': 'filename',
+                    'original': file_info['fileName'],
+                    'replacement': new_name
+                })
+    
+    # Preview content changes
+    if search_scope in ['contents', 'both'] and content is not None:
+        try:
+            if multiline_mode:
+                # Check if pattern exists in content
+                if search_in_content_multiline(content, search_pattern, exclude_wikilinks):
+                    # Show what will be changed
+                    if '*' not in search_pattern and '?' not in search_pattern:
+                        # For literal patterns
+                        pos = content.find(search_pattern)
+                        if pos != -1:
+                            line_num = content[:pos].count('\n') + 1
+                            
+                            if delete_mode:
+                                # Show what will be deleted
+                                deleted_text = search_pattern
+                                if delete_trailing_linebreaks and pos + len(search_pattern) < len(content) and content[pos + len(search_pattern)] == '\n':
+                                    deleted_text += '\\n'
+                                
+                                preview['changes'].append({
+                                    'type': 'content',
+                                    'original': deleted_text.replace('\n', '\\n'),
+                                    'replacement': '[Deleted]',
+                                    'lineNumber': line_num
+                                })
+                            else:
+                                preview['changes'].append({
+                                    'type': 'content',
+                                    'original': search_pattern.replace('\n', '\\n'),
+                                    'replacement': replace_pattern.replace('\n', '\\n'),
+                                    'lineNumber': line_num
+                                })
+                    elif replace_in_content_multiline(
+                            content, search_pattern, replace_pattern, exclude_wikilinks,
+                            delete_mode, delete_trailing_linebreaks) != content:
+                        # For wildcard patterns (only if the replace would change something)
+                        preview['changes'].append({
+                            'type': 'content',
+                            'original': f'[Multiline wildcard match for: {search_pattern}]',
+                            'replacement': '[Content will be modified]' if not delete_mode else '[Content will be deleted]',
+                            'lineNumber': None
+                        })
+            else:
+                # Original line-by-line preview
+                lines = content.split('\n')
+                for i, line in enumerate(lines):
+                    if search_in_line_excluding_wikilinks(line, search_pattern, exclude_wikilinks):
+                        if delete_mode:
+                            # For delete mode, show what will be removed
+                            new_line = replace_in_line_excluding_wikilinks(line, search_pattern, '', exclude_wikilinks)
+                        else:
+                            new_line = replace_in_line_excluding_wikilinks(line, search_pattern, replace_pattern, exclude_wikilinks)
+                        
+                        if new_line != line:  # Only show if there's an actual change
+                            preview['changes'].append({
+                                'type': 'content',
+                                'original': line,
+                                'replacement': new_line if not delete_mode else '[Line content will be modified]',
+                                'lineNumber': i + 1
+                            })
+        except Exception as e:
+            logger.error(f"Error previewing file {file_info['fullPath']}: {e}")
+    
+    return preview if preview['changes'] else None
+
+def read_note_content(file_path):
+    """Text of a note, or None (logged) if it cannot be read"""
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return f.read()
+    except Exception as e:
+        logger.error(f"Error reading file {file_path}: {e}")
+        return None
+
+def content_digest(content):
+    """Hash identifying the exact text a replace plan was computed from"""
+    return hashlib.sha256(content.encode('utf-8', 'surrogatepass')).hexdigest()
+
+def plan_file_replace(file_info, content, search_pattern, replace_pattern, search_scope, exclude_wikilinks=True,
+                      multiline_mode=False, delete_mode=False, delete_trailing_linebreaks=True):
+    """Compute the edits a replace makes to one file; returns the plan entry or None.
+
+    content is the file's text, or None if it was not read. The entry holds
+    the new content, the hash of the content it was computed from and the
+    new file name.
+    """
+    entry = {
+        'fullPath': file_info['fullPath'],
+        'relativePath': file_info['relativePath'],
+        'fileName': file_info['fileName'],
+        'contentHash': None,
+        'newContent': None,
+        'contentChanges': 0,
+        'newFileName': None
+    }
+    
+    # Replace in content
+    if search_scope in ['contents', 'both'] and content is not None:
+        try:
+            if multiline_mode:
+                # Multiline replacement
+                new_content = replace_in_content_multiline(
+                    content, search_pattern, replace_pattern, 
+                    exclude_wikilinks, delete_mode, delete_trailing_linebreaks
+                )
+                
+                if new_content != content:
+                    entry['contentChanges'] = 1
+                    entry['newContent'] = new_content
+            else:
+                # Original line-by-line replacement
+                lines = content.split('\n')
+                new_lines = []
+                
+                for line in lines:
+                    if search_in_line_excluding_wikilinks(line, search_pattern, exclude_wikilinks):
+                        if delete_mode:
+                            new_line = replace_in_line_excluding_wikilinks(line, search_pattern, '', exclude_wikilinks)
+                        else:
+                            new_line = replace_in_line_excluding_wikilinks(line, search_pattern, replace_pattern, exclude_wikilinks)
+                        
+                        if new_line != line:
+                            entry['contentChanges'] += 1
+                        new_lines.append(new_line)
+                    else:
+                        new_lines.append(line)
+                
+                if entry['contentChanges']:
+                    entry['newContent'] = '\n'.join(new_lines)
+            
+            if entry['newContent'] is not None:
+                entry['contentHash'] = content_digest(content)
+        except Exception as e:
+            logger.error(f"Error processing file {file_info['fullPath']}: {e}")
+    
+    # Replace in filename
+    if search_scope in ['names', 'both']:
+        if matches_wildcard(file_info['fileName'], search_pattern, multiline=False):
+            if delete_mode:
+                # For delete mode in filenames, remove the matched pattern
+                entry['newFileName'] = file_info['fileName'].replace(search_pattern, '')
+            else:
+                entry['newFileName'] = replace_with_wildcard(file_info['fileName'], search_pattern, replace_pattern, multiline=False)
+    
+    if entry['newContent'] is None and entry['newFileName'] is None:
+        return None
+    return entry
+
+def stage_file_replace(entry, batch):
+    """Stage a plan entry in a WriteBatch: new content first, then the rename"""
+    result = {
+        'fullPath': entry['fullPath'],
+        'relativePath': entry['relativePath'],
+        'fileName': entry['fileName'],
+        'changes': 0
+    }
+    
+    # Replace in content first (before renaming file)
+    if entry['newContent'] is not None:
+        batch.write(entry['fullPath'], entry['newContent'])
+        result['changes'] += entry['contentChanges']
+    
+    # Replace in filename
+    if entry['newFileName'] is not None:
+        new_path = os.path.join(os.path.dirname(entry['fullPath']), entry['newFileName'])
+        batch.rename(entry['fullPath'], new_path)
+        result['changes'] += 1
+        result['newFileName'] = entry['newFileName']
+    
+    return result
+
+REPLACE_PLAN_KEEP_COUNT = 8
+replace_plans = {}
+replace_plans_lock = threading.Lock()
+
+def store_replace_plan(data, entries):
+    """Keep a previewed replace plan for /api/replace; returns its token.
+
+    entries come from iter_previews() and hold only each file's content hash
+    and planned name, not its new content; replay_plan_entry() recomputes
+    that from the unchanged file.
+    """
+    token = uuid.uuid4().hex
+    with replace_plans_lock:
+        replace_plans[token] = {'request': data, 'entries': entries}
+        # Drop the oldest plans
+        while len(replace_plans) > REPLACE_PLAN_KEEP_COUNT:
+            del replace_plans[next(iter(replace_plans))]
+    return token
+
+def get_replace_plan(token):
+    """A stored replace plan, left in place until discard_replace_plan()"""
+    with replace_plans_lock:
+        return replace_plans.get(token)
+
+def discard_replace_plan(token):
+    """Forget a stored replace plan (plans are applied at most once)"""
+    with replace_plans_lock:
+        replace_plans.pop(token, None)
+
+def replay_plan_entry(entry, plan_request):
+    """Recompute a stored plan entry from its file, or None if the file changed since the preview"""
+    if entry['contentHash'] is None:
+        # Rename only: the file just has to still be there
+        return entry if os.path.exists(entry['fullPath']) else None
+    
+    content = read_note_content(entry['fullPath'])
+    if content is None or content_digest(content) != entry['contentHash']:
+        return None
+    return plan_file_replace(
+        entry, content, plan_request.get('searchPattern'), plan_request.get('replacePattern', ''),
+        plan_request.get('searchScope'), plan_request.get('excludeWikilinks', True),
+        plan_request.get('multilineMode', False), plan_request.get('deleteMode', False),
+        plan_request.get('deleteTrailingLineBreaks', True)
+    )
+
+def search_request_files(data, selected_files=None, prefilter=True):
+    """Files targeted by a search/preview request and their trigram content candidates (None if not prefiltered)"""
+    search_pattern = data.get('searchPattern')
+    search_scope = data.get('searchScope')
+    target_path = data.get('targetPath', VAULT_PATH)
+    vault_path = data.get('vaultPath', VAULT_PATH)
+    target_file = data.get('targetFile')
     
-    # For other operators, property must exist and have a value
+    # Get files to search
+    if target_file:
+        files = [{
+            'fullPath': target_file,
+            'relativePath': os.path.relpath(target_file, vault_path),
+            'fileName': os.path.basename(target_file)
+        }]
+    else:
+        files = get_md_files(target_path or vault_path, vault_path)
+    
+    # Filter to only selected files if provided
+    if selected_files:
+        files = [f for f in files if f['fullPath'] in selected_files]
+    
+    # Only read notes that can contain the pattern's literal parts
+    content_candidates = None
+    if prefilter and search_scope in ['contents', 'both'] and not target_file:
+        content_candidates = trigram_index.candidates(
+            [f['fullPath'] for f in files], search_pattern,
+            validate=not vault_is_watched(target_path or vault_path)
+        )
+    
+    return files, content_candidates
+
+def iter_previews(data, plan_entries=None):
+    """Yield the preview of each file a preview request would change, in file order.
+
+    If plan_entries is given, the replace plan computed from the same read of
+    each file is appended to it, without the new content, so memory stays
+    flat however many files the preview changes.
+    """
+    search_pattern = data.get('searchPattern')
+    replace_pattern = data.get('replacePattern', '')
+    search_scope = data.get('searchScope')
+    exclude_wikilinks = data.get('excludeWikilinks', True)
+    multiline_mode = data.get('multilineMode', False)
+    delete_mode = data.get('deleteMode', False)
+    delete_trailing_linebreaks = data.get('deleteTrailingLineBreaks', True)
+    
+    files, content_candidates = search_request_files(data, data.get('selectedFiles', []))
+    for file_info in files:
+        content = None
+        if search_scope in ['contents', 'both'] and (
+                content_candidates is None or file_info['fullPath'] in content_candidates):
+            content = read_note_content(file_info['fullPath'])
+        
+        preview = preview_file(
+            file_info, content, search_pattern, replace_pattern, search_scope, exclude_wikilinks,
+            multiline_mode, delete_mode, delete_trailing_linebreaks
+        )
+        if plan_entries is not None:
+            entry = plan_file_replace(
+                file_info, content, search_pattern, replace_pattern, search_scope, exclude_wikilinks,
+                multiline_mode, delete_mode, delete_trailing_linebreaks
+            )
+            if entry:
+                plan_entries.append(dict(entry, newContent=None))
+        if preview:
+            yield preview
+
+def parse_indexed_query(pattern):
+    """(tokens, phrase) of a mode: "indexed" search pattern.
+
+    A pattern in double quotes is a phrase; otherwise every token must occur
+    on the line, the last one possibly as a prefix (search as you type).
+    """
+    text = pattern.strip()
+    phrase = len(text) >= 2 and text[0] == '"' and text[-1] == '"'
+    return [token.lower() for token in FULL_TEXT_TOKEN_PATTERN.findall(text)], phrase
+
+def full_text_expression(tokens, phrase):
+    """FTS5 MATCH expression for a parsed indexed query"""
+    if phrase:
+        return '"' + ' '.join(tokens) + '"'
+    return ' '.join(f'"{token}"' for token in tokens) + '*'
+
+def line_matches_indexed_query(line, tokens, phrase, exclude_wikilinks=True):
+    """Check a line of a note against a parsed indexed query, as FTS5 matches it"""
+    if exclude_wikilinks:
+        fragments = [line[start:end] for start, end in text_outside_wikilinks(line, find_wikilink_spans(line))]
+    else:
+        fragments = [line]
+    fragment_words = [[word.lower() for word in FULL_TEXT_TOKEN_PATTERN.findall(fragment)] for fragment in fragments]
+    
+    if phrase:
+        n = len(tokens)
+        return any(words[i:i + n] == tokens for words in fragment_words for i in range(len(words) - n + 1))
+    
+    words = {word for fragment in fragment_words for word in fragment}
+    return set(tokens[:-1]) <= words and any(word.startswith(tokens[-1]) for word in words)
+
+def verify_indexed_hits(file_path, line_indexes, tokens, phrase, exclude_wikilinks=True):
+    """Content matches for a note's full-text hits, confirmed against its current content"""
+    try:
+        stat = os.stat(file_path)
+        with open(file_path, 'r', encoding='utf-8') as f:
+            lines = f.read().split('\n')
+    except Exception as e:
+        logger.error(f"Error reading file {file_path}: {e}")
+        return []
+    
+    if full_text_index.indexed_key(file_path) != (stat.st_mtime_ns, stat.st_size):
+        # Changed since it was indexed, so the hits may point at the wrong lines
+        line_indexes = range(len(lines))
+    
+    return [{
+        'type': 'content',
+        'original': lines[i],
+        'lineNumber': i + 1
+    } for i in line_indexes if i < len(lines) and line_matches_indexed_query(lines[i], tokens, phrase, exclude_wikilinks)]
+
+def iter_indexed_search(files, search_pattern, search_scope, exclude_wikilinks=True, validate=True):
+    """Search with the full-text index, yielding match infos in file order.
+
+    Names are matched as in a scan; content hits come from the index and
+    are re-checked against the live file before being reported.
+    """
+    tokens, phrase = parse_indexed_query(search_pattern)
+    hits = {}
+    if search_scope in ['contents', 'both']:
+        hits = full_text_index.search([f['fullPath'] for f in files], full_text_expression(tokens, phrase), validate)
+    
+    for file_info in files:
+        match_info = None
+        if search_scope in ['names', 'both']:
+            match_info = search_file(file_info, search_pattern, 'names')
+        
+        line_indexes = hits.get(file_info['fullPath'])
+        if line_indexes:
+            content_matches = verify_indexed_hits(file_info['fullPath'], line_indexes, tokens, phrase, exclude_wikilinks)
+            if content_matches:
+                if match_info is None:
+                    match_info = {
+                        'fullPath': file_info['fullPath'],
+                        'relativePath': file_info['relativePath'],
+                        'fileName': file_info['fileName'],
+                        'matches': []
+                    }
+                match_info['matches'].extend(content_matches)
+        
+        if match_info:
+            yield match_info
+
+def search_mode(data):
+    """'indexed' if a search request asks for it and the full-text index can serve it, else 'scan'"""
+    if data.get('mode') != 'indexed':
+        return 'scan'
+    tokens, phrase = parse_indexed_query(data.get('searchPattern') or '')
+    if tokens and full_text_index.open(VAULT_PATH):
+        return 'indexed'
+    return 'scan'
+
+def iter_search_matches(data, mode='scan'):
+    """Yield the match info of each file matching a search request, in file order"""
+    if mode == 'indexed':
+        files, _ = search_request_files(data, prefilter=False)
+        target_path = data.get('targetPath', VAULT_PATH) or data.get('vaultPath', VAULT_PATH)
+        return iter_indexed_search(
+            files, data.get('searchPattern'), data.get('searchScope'),
+            data.get('excludeWikilinks', True), validate=not vault_is_watched(target_path)
+        )
+    
+    if data.get('mode') == 'indexed':
+        # No full-text index: scan for the phrase itself
+        tokens, phrase = parse_indexed_query(data['searchPattern'])
+        if phrase:
+            data = dict(data, searchPattern=data['searchPattern'].strip()[1:-1])
+    
+    files, content_candidates = search_request_files(data)
+    return iter_search_files(
+        files, data.get('searchPattern'), data.get('searchScope'),
+        data.get('excludeWikilinks', True), data.get('multilineMode', False), content_candidates
+    )
+
+def stream_ndjson(records, count_key, total_key, summary_extra=None):
+    """Stream records as newline-delimited JSON, then a final summary record.
+
+    Each record is flushed as soon as it is produced so clients can render
+    results while the rest of the vault is still being scanned; only the
+    running totals are kept. summary_extra, if given, is called once the
+    records are exhausted and its fields are added to the summary.
+    """
+    def generate():
+        total_files = 0
+        total = 0
+        try:
+            for item in records:
+                total_files += 1
+                total += len(item[count_key])
+                yield json.dumps({'type': 'result', 'result': item}) + '\n'
+            summary = {'type': 'summary', 'totalFiles': total_files, total_key: total}
+            if summary_extra:
+                summary.update(summary_extra())
+            yield json.dumps(summary) + '\n'
+        except Exception as e:
+            logger.error(f"Streaming error: {e}")
+            yield json.dumps({'type': 'error', 'error': str(e)}) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+# ============== Query Tool Functions ==============
+
+class QueryError(ValueError):
+    """Raised when a query expression cannot be compiled"""
+
+QUERY_OPERATORS = ('equals', 'contains', 'startsWith', 'endsWith', 'exists', 'notExists')
+
+def has_property_value(frontmatter, property_name):
+    """True if the property exists and has a non-empty value"""
     if not frontmatter or property_name not in frontmatter:
         return False
-    
     prop_value = frontmatter[property_name]
-    
-    # Handle list properties
-    if isinstance(prop_value, list):
-        # Check if any item in the list matches
-        for item in prop_value:
-            if evaluate_single_value(str(item), operator, value):
-                return True
+    if prop_value is None or prop_value == '' or (isinstance(prop_value, list) and len(prop_value) == 0):
         return False
-    else:
-        # Handle text properties
-        return evaluate_single_value(str(prop_value), operator, value)
+    return True
 
-def evaluate_single_value(prop_value, operator, match_value):
-    """Evaluate a single value against an operator and match value"""
-    # Handle wildcard matching
+def compile_value_matcher(operator, match_value):
+    """Build a predicate testing a single (stringified) value against an operator and match value"""
+    # Handle wildcard matching ('*' is the only special character)
     if '*' in match_value:
-        pattern = match_value.replace('*', '.*')
-        pattern = f"^{pattern}$"
-        matches = bool(re.match(pattern, prop_value))
-        return matches if operator == 'equals' else False
+        if operator != 'equals':
+            return lambda prop_value: False
+        regex = re.compile('.*'.join(re.escape(part) for part in match_value.split('*')), re.DOTALL)
+        return lambda prop_value: regex.fullmatch(prop_value) is not None
     
     # Handle different operators
     if operator == 'equals':
-        return prop_value == match_value
+        return lambda prop_value: prop_value == match_value
     elif operator == 'contains':
-        return match_value in prop_value
+        return lambda prop_value: match_value in prop_value
     elif operator == 'startsWith':
-        return prop_value.startswith(match_value)
+        return lambda prop_value: prop_value.startswith(match_value)
     elif operator == 'endsWith':
-        return prop_value.endswith(match_value)
-    
-    return False
-
-def evaluate_expression(frontmatter, expression):
-    """Evaluate a boolean expression against frontmatter"""
-    # Special case: if expression contains only 'notExists' conditions and no frontmatter
-    # we need to handle this differently
-    
-    # Convert expression to evaluatable format
-    eval_parts = []
-    i = 0
-    
-    while i < len(expression):
-        item = expression[i]
-        
-        if item['type'] == 'condition':
-            result = evaluate_condition(frontmatter, item)
-            eval_parts.append(str(result))
-        elif item['type'] == 'operator':
-            op = item['value']
-            if op == 'AND':
-                eval_parts.append('and')
-            elif op == 'OR':
-                eval_parts.append('or')
-            elif op == 'NOT':
-                eval_parts.append('not')
-            elif op in ['(', ')']:
-                eval_parts.append(op)
-        
-        i += 1
-    
-    # Evaluate the boolean expression
-    try:
-        eval_string = ' '.join(eval_parts)
-        return eval(eval_string)
-    except:
-        return False
+        return lambda prop_value: prop_value.endswith(match_value)
+    
+    raise QueryError(f"Unknown operator: {operator}")
 
-def find_matching_files(expression, include_properties=None, search_path=None, target_file=None):
-    """Find all files matching the query expression, optionally including specific properties"""
-    matching_files = []
+def compile_condition(condition):
+    """Compile a single condition into a predicate over frontmatter"""
+    property_name = condition.get('property')
+    operator = condition.get('operator')
+    value = condition.get('value', '')
+    
+    if not property_name:
+        raise QueryError("Condition is missing a property name")
+    if operator not in QUERY_OPERATORS:
+        raise QueryError(f"Unknown operator: {operator}")
+    
+    # Property exists and has a non-empty value
+    if operator == 'exists':
+        return lambda frontmatter: has_property_value(frontmatter, property_name)
+    
+    # Property doesn't exist or is empty/null (also true without any frontmatter)
+    if operator == 'notExists':
+        return lambda frontmatter: not has_property_value(frontmatter, property_name)
+    
+    if not isinstance(value, str):
+        raise QueryError(f"Value for '{property_name}' must be a string")
+    matcher = compile_value_matcher(operator, value)
+    
+    def match(frontmatter):
+        # For other operators, property must exist and have a value
+        if not frontmatter or property_name not in frontmatter:
+            return False
+        prop_value = frontmatter[property_name]
+        # For list properties any item may match
+        if isinstance(prop_value, list):
+            return any(matcher(str(item)) for item in prop_value)
+        return matcher(str(prop_value))
     
+    return match
+
+def compile_plan(node):
+    """Turn a plan tree into a short-circuiting predicate over frontmatter"""
+    kind = node[0]
+    if kind == 'condition':
+        return node[2]
+    if kind == 'not':
+        child = compile_plan(node[1])
+        return lambda frontmatter: not child(frontmatter)
+    children = [compile_plan(child) for child in node[1]]
+    if kind == 'and':
+        return lambda frontmatter: all(child(frontmatter) for child in children)
+    return lambda frontmatter: any(child(frontmatter) for child in children)
+
+def compile_expression(expression):
+    """Compile an expression token list once per request.
+
+    Returns (plan, predicate): the plan tree is resolved against the
+    frontmatter index, the predicate evaluates a single note's frontmatter.
+    Raises QueryError for malformed expressions.
+    """
+    plan = parse_expression(expression)
+    return plan, compile_plan(plan)
+
+def parse_expression(expression):
+    """Parse an expression token list into a plan tree.
+
+    NOT binds tighter than AND, which binds tighter than OR. Nodes are
+    ('condition', item, predicate), ('not', node), ('and', [nodes]) and
+    ('or', [nodes]). Raises QueryError if the expression is malformed.
+    """
+    tokens = []
+    for item in expression:
+        item_type = item.get('type') if isinstance(item, dict) else None
+        if item_type == 'condition':
+            tokens.append(item)
+        elif item_type == 'operator' and item.get('value') in ('AND', 'OR', 'NOT', '(', ')'):
+            tokens.append(item['value'])
+        else:
+            raise QueryError(f"Invalid expression item: {item!r}")
+
+    pos = 0
+
+    def peek():
+        return tokens[pos] if pos < len(tokens) else None
+
+    def parse_or():
+        nonlocal pos
+        children = [parse_and()]
+        while peek() == 'OR':
+            pos += 1
+            children.append(parse_and())
+        return children[0] if len(children) == 1 else ('or', children)
+
+    def parse_and():
+        nonlocal pos
+        children = [parse_not()]
+        while peek() == 'AND':
+            pos += 1
+            children.append(parse_not())
+        return children[0] if len(children) == 1 else ('and', children)
+
+    def parse_not():
+        nonlocal pos
+        if peek() == 'NOT':
+            pos += 1
+            return ('not', parse_not())
+        return parse_atom()
+
+    def parse_atom():
+        nonlocal pos
+        token = peek()
+        if token == '(':
+            pos += 1
+            node = parse_or()
+            if peek() != ')':
+                raise QueryError("Unbalanced parentheses in expression")
+            pos += 1
+            return node
+        if isinstance(token, dict):
+            pos += 1
+            return ('condition', token, compile_condition(token))
+        if token is None:
+            raise QueryError("Expression ends unexpectedly")
+        raise QueryError(f"Unexpected '{token}' in expression")
+
+    plan = parse_or()
+    if pos != len(tokens):
+        token = tokens[pos]
+        if isinstance(token, dict):
+            raise QueryError(f"Missing operator before condition on '{token.get('property')}'")
+        raise QueryError(f"Unexpected '{token}' in expression")
+    return plan
+
+QUERY_RESULT_FIELDS = ('name', 'path', 'full_path', 'properties')
+
+def find_matching_notes(expression, search_path=None, target_file=None):
+    """(file_path, frontmatter) for every note matching the query expression, ordered by vault-relative path"""
     # Determine if we have a query to evaluate
     has_query = expression and len(expression) > 0
     
+    # Compile the expression once; malformed expressions raise QueryError here
+    plan, predicate = compile_expression(expression) if has_query else (None, None)
+    
     # Determine the search path
     if target_file:
         # If a specific file is targeted, only check that file
         if os.path.exists(target_file) and target_file.endswith('.md'):
-            frontmatter, _ = read_frontmatter(target_file)
+            frontmatter = frontmatter_index.get(target_file)
             
             # If no query, include the file. If query exists, evaluate it
             # Important: evaluate even if frontmatter is None for 'notExists' operator
-            if not has_query or evaluate_expression(frontmatter, expression):
-                relative_path = os.path.relpath(target_file, VAULT_PATH)
-                file_info = {
-                    'name': os.path.basename(target_file),
-                    'path': relative_path,
-                    'full_path': target_file
-                }
-                
-                # Include requested properties if specified
-                if include_properties and frontmatter:
-                    file_info['properties'] = {}
-                    for prop in include_properties:
-                        if prop in frontmatter:
-                            file_info['properties'][prop] = frontmatter[prop]
-                        else:
-                            file_info['properties'][prop] = None
-                elif include_properties:
-                    # No frontmatter, set all properties to None
-                    file_info['properties'] = {prop: None for prop in include_properties}
-                
-                matching_files.append(file_info)
+            if not has_query or predicate(frontmatter):
+                return [(target_file, frontmatter)]
+        return []
+    
+    # Otherwise, search in the specified path or vault
+    search_root = search_path or VAULT_PATH
+    
+    # Walk through all markdown files in the search path, using cached frontmatter
+    notes = list_vault_notes(search_root)
+    
+    # Answer the query from the inverted index. If no query, include all files.
+    # Otherwise the plan has already been evaluated for every note, including
+    # those without frontmatter
+    if has_query:
+        matched_paths = frontmatter_index.select(plan, [file_path for file_path, _ in notes])
+        notes = [(file_path, frontmatter) for file_path, frontmatter in notes if file_path in matched_paths]
+    
+    # Stable ordering so results can be paged with a cursor
+    notes.sort(key=lambda note: os.path.relpath(note[0], VAULT_PATH))
+    return notes
+
+def format_query_result(file_path, frontmatter, include_properties=None, fields=None):
+    """Result row for a matching note, restricted to the requested fields"""
+    if fields is None:
+        fields = QUERY_RESULT_FIELDS
+    file_info = {}
+    if 'name' in fields:
+        file_info['name'] = os.path.basename(file_path)
+    if 'path' in fields:
+        file_info['path'] = os.path.relpath(file_path, VAULT_PATH)
+    if 'full_path' in fields:
+        file_info['full_path'] = file_path
+    
+    # Include requested properties if specified
+    if 'properties' in fields and include_properties:
+        if frontmatter:
+            file_info['properties'] = {}
+            for prop in include_properties:
+                if prop in frontmatter:
+                    file_info['properties'][prop] = frontmatter[prop]
+                else:
+                    file_info['properties'][prop] = None
+        else:
+            # No frontmatter, set all properties to None
+            file_info['properties'] = {prop: None for prop in include_properties}
+    
+    return file_info
+
+def find_matching_files(expression, include_properties=None, search_path=None, target_file=None):
+    """Find all files matching the query expression, optionally including specific properties"""
+    return [
+        format_query_result(file_path, frontmatter, include_properties)
+        for file_path, frontmatter in find_matching_notes(expression, search_path, target_file)
+    ]
+
+def paginate_notes(notes, limit=None, cursor=None):
+    """One page of path-ordered notes and the cursor for the next page (None on the last page).
+
+    The cursor is the vault-relative path of the last note returned, so pages
+    stay consistent when notes before it are added or removed.
+    """
+    if limit is not None and (isinstance(limit, bool) or not isinstance(limit, int) or limit < 1):
+        raise QueryError('limit must be a positive integer')
+    if cursor is not None and not isinstance(cursor, str):
+        raise QueryError('cursor must be a string')
+    
+    start = 0
+    if cursor:
+        keys = [os.path.relpath(file_path, VAULT_PATH) for file_path, _ in notes]
+        start = bisect.bisect_right(keys, cursor)
+    
+    if limit is None:
+        return notes[start:], None
+    
+    page = notes[start:start + limit]
+    next_cursor = None
+    if start + limit < len(notes):
+        next_cursor = os.path.relpath(page[-1][0], VAULT_PATH)
+    return page, next_cursor
+
+# ============== Property Modification Functions ==============
+
+class OperationError(ValueError):
+    """Raised when a batch modify operation is malformed"""
+
+MODIFY_OPERATIONS = ('set', 'append', 'replace', 'remove', 'rename')
+# Per-file parse/render/stage work for /modify and /modify-batch
+MODIFY_WORKERS = min(8, (os.cpu_count() or 1) + 4)
+
+def modify_property(frontmatter, property_name, original_value, new_value):
+    """Apply a /modify change to one note's frontmatter; returns (modified, before, after)"""
+    modified = False
+    before_value = None
+    after_value = None
+    
+    if property_name in frontmatter:
+        current_value = frontmatter[property_name]
+        before_value = current_value
         
-        return matching_files
+        if isinstance(current_value, list):
+            # Handle list property
+            if original_value and original_value in current_value:
+                # Replace specific value in list
+                idx = current_value.index(original_value)
+                current_value[idx] = new_value
+                modified = True
+            elif new_value not in current_value:
+                # Append to list
+                if isinstance(new_value, list):
+                    # If new value is a list, extend the current list
+                    current_value.extend(new_value)
+                else:
+                    # Otherwise append as single item
+                    current_value.append(new_value)
+                modified = True
+            
+            after_value = current_value
+        else:
+            # Handle text property
+            if not original_value or str(current_value) == original_value:
+                frontmatter[property_name] = new_value
+                after_value = new_value
+                modified = True
+    else:
+        # Property doesn't exist, add it
+        frontmatter[property_name] = new_value
+        after_value = new_value
+        modified = True
+    
+    return modified, before_value, after_value
+
+def validate_operations(operations):
+    """Check a /modify-batch operation list, raising OperationError if malformed"""
+    if not isinstance(operations, list) or not operations:
+        raise OperationError('operations must be a non-empty list')
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, dict) or operation.get('op') not in MODIFY_OPERATIONS:
+            raise OperationError(f"operation {index}: op must be one of {', '.join(MODIFY_OPERATIONS)}")
+        if not isinstance(operation.get('property'), str) or not operation['property']:
+            raise OperationError(f"operation {index}: missing property")
+        op = operation['op']
+        if op in ('set', 'append', 'replace') and 'value' not in operation:
+            raise OperationError(f"operation {index}: '{op}' needs a value")
+        if op == 'replace' and 'original' not in operation:
+            raise OperationError(f"operation {index}: 'replace' needs an original value")
+        if op == 'rename' and (not isinstance(operation.get('newName'), str) or not operation['newName']):
+            raise OperationError(f"operation {index}: 'rename' needs a newName")
+
+def same_value(current, expected):
+    """Compare a frontmatter value with a JSON one, matching /modify's string comparison for scalars"""
+    if current == expected:
+        return True
+    return not isinstance(current, (list, dict)) and str(current) == str(expected)
+
+def apply_operation(frontmatter, operation):
+    """Apply one batch operation to a note's frontmatter; returns (modified, before, after)"""
+    op = operation['op']
+    property_name = operation['property']
+    exists = property_name in frontmatter
+    current_value = frontmatter.get(property_name)
+    before_value = copy.deepcopy(current_value)
+    
+    if op == 'set':
+        new_value = operation['value']
+        if exists and current_value == new_value:
+            return False, before_value, current_value
+        frontmatter[property_name] = copy.deepcopy(new_value)
+    
+    elif op == 'append':
+        new_value = operation['value']
+        items = new_value if isinstance(new_value, list) else [new_value]
+        if isinstance(current_value, list):
+            values = current_value
+        elif current_value is None or current_value == '':
+            values = []
+        else:
+            # A single value becomes a list
+            values = [current_value]
+        added = False
+        for item in items:
+            if item not in values:
+                values.append(copy.deepcopy(item))
+                added = True
+        if not added:
+            return False, before_value, current_value
+        frontmatter[property_name] = values
+    
+    elif op == 'replace':
+        original_value = operation['original']
+        if isinstance(current_value, list):
+            matches = [i for i, item in enumerate(current_value) if same_value(item, original_value)]
+            if not matches:
+                return False, before_value, current_value
+            current_value[matches[0]] = copy.deepcopy(operation['value'])
+        elif exists and same_value(current_value, original_value):
+            frontmatter[property_name] = copy.deepcopy(operation['value'])
+        else:
+            return False, before_value, current_value
+    
+    elif op == 'remove':
+        if not exists:
+            return False, before_value, None
+        if 'value' in operation and isinstance(current_value, list):
+            # Remove matching items from a list property
+            remaining = [item for item in current_value if not same_value(item, operation['value'])]
+            if len(remaining) == len(current_value):
+                return False, before_value, current_value
+            frontmatter[property_name] = remaining
+        elif 'value' in operation and not same_value(current_value, operation['value']):
+            return False, before_value, current_value
+        else:
+            del frontmatter[property_name]
+            return True, before_value, None
     
-    # Otherwise, search in the specified path or vault
-    search_root = search_path or VAULT_PATH
+    elif op == 'rename':
+        new_name = operation['newName']
+        # Never overwrite an existing property
+        if not exists or new_name == property_name or new_name in frontmatter:
+            return False, property_name, property_name
+        # Keep the property in its original position
+        items = list(frontmatter.items())
+        frontmatter.clear()
+        frontmatter.update((new_name if key == property_name else key, value) for key, value in items)
+        return True, property_name, new_name
     
-    # Walk through all markdown files in the search path
-    for root, dirs, files in os.walk(search_root):
-        # Skip hidden directories
-        dirs[:] = [d for d in dirs if not d.startswith('.')]
+    return True, before_value, frontmatter[property_name]
+
+def stage_modified_files(files, change):
+    """Read-modify-render the frontmatter of each file once, staging the writes in one WriteBatch.
+
+    change(frontmatter) edits the frontmatter in place and returns a record
+    of what it did, or None if nothing changed. Returns (batch, modifications);
+    nothing is written until commit_modified_files().
+    """
+    batch = WriteBatch()
+    
+    def modify_file(file_path):
+        full_path = os.path.join(VAULT_PATH, file_path)
+        # The body is only read if this file actually gets written
+        frontmatter = read_frontmatter_only(full_path)
         
-        for file in files:
-            if file.endswith('.md'):
-                file_path = os.path.join(root, file)
-                frontmatter, _ = read_frontmatter(file_path)
-                
-                # If no query, include all files. If query exists, evaluate it
-                # Key change: We now evaluate the expression even when frontmatter is None
-                # This allows 'notExists' conditions to match files without frontmatter
-                if not has_query or evaluate_expression(frontmatter, expression):
-                    relative_path = os.path.relpath(file_path, VAULT_PATH)
-                    file_info = {
-                        'name': file,
-                        'path': relative_path,
-                        'full_path': file_path
-                    }
-                    
-                    # Include requested properties if specified
-                    if include_properties and frontmatter:
-                        file_info['properties'] = {}
-                        for prop in include_properties:
-                            if prop in frontmatter:
-                                file_info['properties'][prop] = frontmatter[prop]
-                            else:
-                                file_info['properties'][prop] = None
-                    elif include_properties:
-                        # No frontmatter, set all properties to None
-                        file_info['properties'] = {prop: None for prop in include_properties}
-                    
-                    matching_files.append(file_info)
+        if frontmatter is None:
+            frontmatter = {}
+        
+        record = change(frontmatter)
+        if not record:
+            return None
+        original_content = read_note_content(full_path) or ''
+        batch.write(full_path, render_frontmatter(frontmatter, original_content))
+        return dict({'file': file_path}, **record)
     
-    return matching_files
+    # Parse, render and stage files on a bounded pool; map() keeps the
+    # results in the order of files whichever worker finishes first
+    files = list(dict.fromkeys(files))
+    workers = min(MODIFY_WORKERS, len(files))
+    if workers > 1:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            records = list(executor.map(modify_file, files))
+    else:
+        records = [modify_file(file_path) for file_path in files]
+    modifications = [record for record in records if record]
+    return batch, modifications
+
+def commit_modified_files(batch, files):
+    """Write all files staged by stage_modified_files() at once, or none of them.
+
+    Returns (file statuses in the order of files, whether all writes succeeded).
+    """
+    statuses = {status['path']: status['status'] for status in batch.commit()}
+    file_statuses = [
+        {'file': file_path, 'status': statuses[os.path.join(VAULT_PATH, file_path)]}
+        for file_path in dict.fromkeys(files) if os.path.join(VAULT_PATH, file_path) in statuses
+    ]
+    return file_statuses, batch.succeeded
 
 # ============== Routes ==============
 
+# Requests run on several threads; operations that back up and rewrite vault
+# files take this lock so they never interleave, while reads stay concurrent
+vault_write_lock = threading.Lock()
+
+def vault_write(view):
+    """Run a route that writes to the vault while holding vault_write_lock"""
+    @functools.wraps(view)
+    def locked_view(*args, **kwargs):
+        with vault_write_lock:
+            return view(*args, **kwargs)
+    return locked_view
+
 @app.route('/')
 def index():
     """Serve the main menu page"""
@@ -781,7 +3901,8 @@ def health():
     return jsonify({
         'status': 'ok', 
         'vault_path': VAULT_PATH,
-        'backup_path': BACKUP_PATH
+        'backup_path': BACKUP_PATH,
+        'backup_mode': BACKUP_MODE
     })
 
 @app.route('/config', methods=['GET'])
@@ -789,42 +3910,53 @@ def get_config():
     """Get current configuration"""
     return jsonify({
         'vault_path': VAULT_PATH,
-        'backup_path': BACKUP_PATH
+        'backup_path': BACKUP_PATH,
+        'backup_mode': BACKUP_MODE
     })
 
 @app.route('/config', methods=['POST'])
 def update_config():
     """Update configuration"""
-    global VAULT_PATH, BACKUP_PATH
+    global VAULT_PATH, BACKUP_PATH, BACKUP_MODE
     
     try:
         data = request.json
         new_vault_path = data.get('vault_path')
         new_backup_path = data.get('backup_path')
+        new_backup_mode = data.get('backup_mode', BACKUP_MODE)
         
         if not new_vault_path or not new_backup_path:
             return jsonify({'error': 'Both vault_path and backup_path are required'}), 400
         
+        if new_backup_mode not in BACKUP_MODES:
+            return jsonify({'error': f'backup_mode must be one of: {", ".join(BACKUP_MODES)}'}), 400
+        
         # Validate paths
         if not os.path.exists(new_vault_path):
             return jsonify({'error': f'Vault path does not exist: {new_vault_path}'}), 400
         
-        # Save configuration
-        new_config = {
+        # Save configuration, keeping settings not managed here (e.g. search_workers)
+        new_config = dict(load_config(), **{
             'vault_path': new_vault_path,
-            'backup_path': new_backup_path
-        }
+            'backup_path': new_backup_path,
+            'backup_mode': new_backup_mode
+        })
         
         if save_config(new_config):
             # Update global variables
             VAULT_PATH = new_vault_path
             BACKUP_PATH = new_backup_path
-            # Note: LOG_FILE and SAVED_QUERIES_FILE remain in script directory
+            BACKUP_MODE = new_backup_mode
+            trigram_index.clear()
+            full_text_index.close()
+            start_vault_watcher(VAULT_PATH)
+            # Note: LOG_DIR and SAVED_QUERIES_FILE remain in script directory
             
             return jsonify({
                 'success': True,
                 'vault_path': VAULT_PATH,
-                'backup_path': BACKUP_PATH
+                'backup_path': BACKUP_PATH,
+                'backup_mode': BACKUP_MODE
             })
         else:
             return jsonify({'error': 'Failed to save configuration'}), 500
@@ -847,19 +3979,26 @@ def get_backup_info():
         # Get all backup directories
         backups = []
         total_size = 0
+        # Snapshots share hard-linked files; count each inode once in the total
+        seen_inodes = set()
         
         for item in os.listdir(BACKUP_PATH):
             item_path = os.path.join(BACKUP_PATH, item)
             if os.path.isdir(item_path) and item.startswith('tonythem_backup_'):
                 try:
                     # Get directory size
-                    size = sum(os.path.getsize(os.path.join(dirpath, filename))
-                              for dirpath, dirnames, filenames in os.walk(item_path)
-                              for filename in filenames)
+                    size = 0
+                    unique_size = 0
+                    for dirpath, dirnames, filenames in os.walk(item_path):
+                        for filename in filenames:
+                            stat = os.lstat(os.path.join(dirpath, filename))
+                            size += stat.st_size
+                            if (stat.st_dev, stat.st_ino) not in seen_inodes:
+                                seen_inodes.add((stat.st_dev, stat.st_ino))
+                                unique_size += stat.st_size
                     
                     # Extract timestamp
-                    timestamp_str = item.replace('tonythem_backup_', '')
-                    timestamp = datetime.strptime(timestamp_str, "%Y%m%d_%H%M%S")
+                    timestamp = parse_backup_stamp(item[len('tonythem_backup_'):])
                     
                     backups.append({
                         'name': item,
@@ -868,13 +4007,32 @@ def get_backup_info():
                         'size': size,
                         'size_mb': round(size / (1024 * 1024), 2)
                     })
-                    total_size += size
+                    total_size += unique_size
                 except Exception as e:
                     logger.error(f"Error processing backup {item}: {e}")
         
         # Sort by timestamp (newest first)
         backups.sort(key=lambda x: x['timestamp'], reverse=True)
         
+        # Content-addressed store: manifests plus the blobs they share
+        manifests = list_content_manifests()
+        if manifests:
+            store_size = sum(os.path.getsize(os.path.join(dirpath, filename))
+                             for dirpath, dirnames, filenames in os.walk(content_store_dir())
+                             for filename in filenames)
+            total_size += store_size
+            for manifest_path in manifests:
+                name = os.path.basename(manifest_path)
+                timestamp = parse_backup_stamp(name[len('tonythem_manifest_'):-len('.json')])
+                backups.append({
+                    'name': name,
+                    'path': manifest_path,
+                    'timestamp': timestamp.isoformat(),
+                    'size': os.path.getsize(manifest_path),
+                    'size_mb': round(os.path.getsize(manifest_path) / (1024 * 1024), 2)
+                })
+            backups.sort(key=lambda x: x['timestamp'], reverse=True)
+        
         return jsonify({
             'backup_count': len(backups),
             'backups': backups[:5],  # Return only the 5 most recent
@@ -886,6 +4044,84 @@ def get_backup_info():
         logger.error(f"Error getting backup info: {e}")
         return jsonify({'error': str(e)}), 500
 
+def parse_history_bound(value, end_of_day=False):
+    """Normalize a since/until parameter to the ISO format log timestamps use.
+
+    A date-only value means the start of that day, or with end_of_day its
+    last microsecond, so until=2024-05-01 includes the whole day.
+    """
+    bound = datetime.fromisoformat(value)
+    if end_of_day and len(value.strip()) == 10:
+        bound = bound.replace(hour=23, minute=59, second=59, microsecond=999999)
+    return bound.isoformat()
+
+@app.route('/history', methods=['GET'])
+def get_history():
+    """Page through the modification log with optional filters"""
+    try:
+        action = request.args.get('action') or None
+        since = request.args.get('since') or None
+        until = request.args.get('until') or None
+        file_path = request.args.get('file') or None
+        backup_path = request.args.get('backup_path') or None
+        cursor = request.args.get('cursor') or None
+        
+        try:
+            limit = min(max(int(request.args.get('limit', 50)), 1), 1000)
+            if cursor is not None:
+                cursor = int(cursor)
+            if since:
+                since = parse_history_bound(since)
+            if until:
+                until = parse_history_bound(until, end_of_day=True)
+        except ValueError as e:
+            return jsonify({'error': f'Invalid parameter: {e}'}), 400
+        
+        if file_path:
+            file_path = normalize_vault_path(file_path)
+        
+        entries, next_cursor = change_log.history(
+            action=action, since=since, until=until, file_path=file_path,
+            backup_path=backup_path, limit=limit, cursor=cursor
+        )
+        
+        return jsonify({
+            'entries': entries,
+            'count': len(entries),
+            'next_cursor': str(next_cursor) if next_cursor is not None else None
+        })
+        
+    except Exception as e:
+        logger.error(f"History error: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/restore/<operation_id>', methods=['POST'])
+@vault_write
+def restore(operation_id):
+    """Restore the files written by an operation from its backup journal"""
+    try:
+        if not re.fullmatch(r'[\w-]+', operation_id) or not os.path.isdir(journal_dir(operation_id)):
+            return jsonify({'error': f'Unknown operation: {operation_id}'}), 404
+        
+        restored = restore_journal(operation_id)
+        
+        log_change('restore', {
+            'operation_id': operation_id,
+            'backup_path': journal_dir(operation_id),
+            'files': restored,
+            'restored_count': len(restored)
+        })
+        
+        return jsonify({
+            'operation_id': operation_id,
+            'restored': len(restored),
+            'files': restored
+        })
+        
+    except Exception as e:
+        logger.error(f"Restore error: {e}")
+        return jsonify({'error': str(e)}), 500
+
 # ============== Query Tool Routes ==============
 
 @app.route('/query', methods=['POST'])
@@ -904,22 +4140,43 @@ def query():
         # Determine the search path
         search_path = target_path if target_path else vault_path
         
-        matching_files = find_matching_files(expression, include_properties, search_path, target_file)
+        limit = data.get('limit', None)
+        cursor = data.get('cursor', None)
+        fields = data.get('fields', None)
         
-        log_change('query', {
-            'expression': expression,
-            'results_count': len(matching_files),
-            'include_properties': include_properties,
-            'search_path': search_path,
-            'target_file': target_file,
-            'has_query': len(expression) > 0
-        })
+        if fields is not None:
+            if not isinstance(fields, list) or any(field not in QUERY_RESULT_FIELDS for field in fields):
+                raise QueryError(f"fields must be a list of: {', '.join(QUERY_RESULT_FIELDS)}")
         
-        return jsonify({
-            'count': len(matching_files),
-            'results': matching_files
-        })
+        matching_notes = find_matching_notes(expression, search_path, target_file)
+        page, next_cursor = paginate_notes(matching_notes, limit, cursor)
+        results = [
+            format_query_result(file_path, frontmatter, include_properties, fields)
+            for file_path, frontmatter in page
+        ]
+        
+        # Only log the first page of a paged query
+        if not cursor:
+            log_change('query', {
+                'expression': expression,
+                'results_count': len(matching_notes),
+                'include_properties': include_properties,
+                'search_path': search_path,
+                'target_file': target_file,
+                'has_query': len(expression) > 0
+            })
+        
+        response = {
+            'count': len(matching_notes),
+            'results': results
+        }
+        if limit is not None:
+            response['next_cursor'] = next_cursor
+        
+        return jsonify(response)
         
+    except QueryError as e:
+        return jsonify({'error': f'Invalid query: {e}'}), 400
     except Exception as e:
         logger.error(f"Query error: {e}")
         return jsonify({'error': str(e)}), 500
@@ -945,8 +4202,11 @@ def save_saved_queries():
         data = request.json
         queries = data.get('queries', [])
         
-        with open(SAVED_QUERIES_FILE, 'w', encoding='utf-8') as f:
+        # Write aside and swap in, so a concurrent GET never reads a half-written file
+        temp_file = f"{SAVED_QUERIES_FILE}.{uuid.uuid4().hex}.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
             json.dump(queries, f, indent=2)
+        os.replace(temp_file, SAVED_QUERIES_FILE)
         
         return jsonify({'success': True})
     except Exception as e:
@@ -965,7 +4225,7 @@ def check_property_types():
         
         for file_path in files:
             full_path = os.path.join(VAULT_PATH, file_path)
-            frontmatter, _ = read_frontmatter(full_path)
+            frontmatter = frontmatter_index.get(full_path)
             
             if frontmatter and property_name in frontmatter:
                 prop_value = frontmatter[property_name]
@@ -994,7 +4254,7 @@ def preview():
         
         for file_path in files[:5]:  # Limit preview to first 5 files
             full_path = os.path.join(VAULT_PATH, file_path)
-            frontmatter, _ = read_frontmatter(full_path)
+            frontmatter = frontmatter_index.get(full_path)
             
             if not frontmatter:
                 frontmatter = {}
@@ -1031,6 +4291,7 @@ def preview():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/modify', methods=['POST'])
+@vault_write
 def modify():
     """Modify properties in selected files"""
     try:
@@ -1040,11 +4301,6 @@ def modify():
         new_value = data.get('newValue')
         files = data.get('files', [])
         
-        # Create backup before modifications
-        backup_success, backup_path = create_backup()
-        if not backup_success:
-            return jsonify({'error': f'Failed to create backup: {backup_path}'}), 500
-        
         # Handle different data types for new properties
         if not original_value and new_value is not None:
             # For new properties, the value might already be processed on the client side
@@ -1066,63 +4322,32 @@ def modify():
                     # For wikilinks, always use the inner value without quotes
                     new_value = temp_value
         
-        modified_count = 0
-        modifications = []
+        def change(frontmatter):
+            modified, before_value, after_value = modify_property(frontmatter, property_name, original_value, new_value)
+            if not modified:
+                return None
+            return {
+                'property': property_name,
+                'before': before_value,
+                'after': after_value
+            }
         
-        for file_path in files:
-            full_path = os.path.join(VAULT_PATH, file_path)
-            frontmatter, original_content = read_frontmatter(full_path)
-            
-            if frontmatter is None:
-                frontmatter = {}
-            
-            modified = False
-            before_value = None
-            after_value = None
-            
-            if property_name in frontmatter:
-                current_value = frontmatter[property_name]
-                before_value = current_value
-                
-                if isinstance(current_value, list):
-                    # Handle list property
-                    if original_value and original_value in current_value:
-                        # Replace specific value in list
-                        idx = current_value.index(original_value)
-                        current_value[idx] = new_value
-                        modified = True
-                    elif new_value not in current_value:
-                        # Append to list
-                        if isinstance(new_value, list):
-                            # If new value is a list, extend the current list
-                            current_value.extend(new_value)
-                        else:
-                            # Otherwise append as single item
-                            current_value.append(new_value)
-                        modified = True
-                    
-                    after_value = current_value
-                else:
-                    # Handle text property
-                    if not original_value or str(current_value) == original_value:
-                        frontmatter[property_name] = new_value
-                        after_value = new_value
-                        modified = True
-            else:
-                # Property doesn't exist, add it
-                frontmatter[property_name] = new_value
-                after_value = new_value
-                modified = True
-            
-            if modified:
-                if write_frontmatter(full_path, frontmatter, original_content):
-                    modified_count += 1
-                    modifications.append({
-                        'file': file_path,
-                        'property': property_name,
-                        'before': before_value,
-                        'after': after_value
-                    })
+        batch, modifications = stage_modified_files(files, change)
+        
+        # Create backup before modifications
+        backup_success, backup_path = backup_batch(batch)
+        if not backup_success:
+            return jsonify({'error': f'Failed to create backup: {backup_path}'}), 500
+        
+        file_statuses, succeeded = commit_modified_files(batch, files)
+        if not succeeded:
+            return jsonify({
+                'error': 'Failed to write changes; no files were modified',
+                'files': file_statuses,
+                'backup_path': backup_path
+            }), 500
+        
+        modified_count = len(modifications)
         
         # Log the changes
         log_change('modify', {
@@ -1138,13 +4363,77 @@ def modify():
         return jsonify({
             'modified': modified_count,
             'total': len(files),
-            'backup_path': backup_path
+            'files': file_statuses,
+            'backup_path': backup_path,
+            'operation_id': journal_operation_id(backup_path)
         })
         
     except Exception as e:
         logger.error(f"Modify error: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/modify-batch', methods=['POST'])
+@vault_write
+def modify_batch():
+    """Apply several property operations to selected files in one pass"""
+    try:
+        data = request.json
+        files = data.get('files', [])
+        operations = data.get('operations', [])
+        
+        validate_operations(operations)
+        
+        def change(frontmatter):
+            applied = []
+            for operation in operations:
+                modified, before_value, after_value = apply_operation(frontmatter, operation)
+                if modified:
+                    applied.append({
+                        'op': operation['op'],
+                        'property': operation['property'],
+                        'before': before_value,
+                        'after': after_value
+                    })
+            return {'operations': applied} if applied else None
+        
+        batch, modifications = stage_modified_files(files, change)
+        
+        # One backup for the whole batch
+        backup_success, backup_path = backup_batch(batch)
+        if not backup_success:
+            return jsonify({'error': f'Failed to create backup: {backup_path}'}), 500
+        
+        file_statuses, succeeded = commit_modified_files(batch, files)
+        if not succeeded:
+            return jsonify({
+                'error': 'Failed to write changes; no files were modified',
+                'files': file_statuses,
+                'backup_path': backup_path
+            }), 500
+        
+        # Log the whole batch as one change
+        log_change('modify_batch', {
+            'operations': operations,
+            'files_count': len(files),
+            'modified_count': len(modifications),
+            'modifications': modifications,
+            'backup_path': backup_path
+        })
+        
+        return jsonify({
+            'modified': len(modifications),
+            'total': len(files),
+            'files': file_statuses,
+            'backup_path': backup_path,
+            'operation_id': journal_operation_id(backup_path)
+        })
+        
+    except OperationError as e:
+        return jsonify({'error': f'Invalid operations: {e}'}), 400
+    except Exception as e:
+        logger.error(f"Modify batch error: {e}")
+        return jsonify({'error': str(e)}), 500
+
 # ============== Search/Replace Routes ==============
 
 @app.route('/api/folders', methods=['POST'])
@@ -1174,7 +4463,17 @@ def get_folders():
             
             return folders
         
-        folders = get_folders_recursive(vault_path, vault_path)
+        if vault_tree_serves(vault_path):
+            folders = []
+            for full_path, name, level in vault_tree.folders(vault_path):
+                folders.append({
+                    'fullPath': full_path,
+                    'relativePath': os.path.relpath(full_path, vault_path),
+                    'name': name,
+                    'level': level
+                })
+        else:
+            folders = get_folders_recursive(vault_path, vault_path)
         folders.insert(0, {
             'fullPath': vault_path,
             'relativePath': '.',
@@ -1211,243 +4510,89 @@ def search():
     """Search for patterns in vault with multiline support"""
     try:
         data = request.json
-        search_pattern = data.get('searchPattern')
-        search_scope = data.get('searchScope')
-        target_path = data.get('targetPath', VAULT_PATH)
-        vault_path = data.get('vaultPath', VAULT_PATH)
-        target_file = data.get('targetFile')
-        exclude_wikilinks = data.get('excludeWikilinks', True)
-        multiline_mode = data.get('multilineMode', False)
         
-        if not search_pattern or not search_scope:
+        if not data.get('searchPattern') or not data.get('searchScope'):
             return jsonify({'error': 'Missing required parameters'}), 400
         
-        # Get files to search
-        if target_file:
-            files = [{
-                'fullPath': target_file,
-                'relativePath': os.path.relpath(target_file, vault_path),
-                'fileName': os.path.basename(target_file)
-            }]
-        else:
-            files = get_md_files(target_path or vault_path, vault_path)
-        
-        matches = []
-        
-        for file_info in files:
-            match_info = {
-                'fullPath': file_info['fullPath'],
-                'relativePath': file_info['relativePath'],
-                'fileName': file_info['fileName'],
-                'matches': []
-            }
-            
-            # Search in filename
-            if search_scope in ['names', 'both']:
-                if matches_wildcard(file_info['fileName'], search_pattern, multiline=False):
-                    match_info['matches'].append({
-                        'type': 'filename',
-                        'original': file_info['fileName'],
-                        'lineNumber': None
-                    })
-            
-            # Search in content
-            if search_scope in ['contents', 'both']:
-                try:
-                    with open(file_info['fullPath'], 'r', encoding='utf-8') as f:
-                        content = f.read()
-                    
-                    if multiline_mode:
-                        # Search entire content at once
-                        if search_in_content_multiline(content, search_pattern, exclude_wikilinks):
-                            # Find the actual match for display
-                            if '*' not in search_pattern and '?' not in search_pattern:
-                                # For literal patterns, show the exact match
-                                pos = content.find(search_pattern)
-                                if pos != -1:
-                                    # Calculate line number of start
-                                    line_num = content[:pos].count('\n') + 1
-                                    match_info['matches'].append({
-                                        'type': 'content',
-                                        'original': search_pattern,
-                                        'lineNumber': line_num
-                                    })
-                            else:
-                                # For wildcard patterns, show that there's a match
-                                match_info['matches'].append({
-                                    'type': 'content',
-                                    'original': f'[Multiline wildcard match for: {search_pattern}]',
-                                    'lineNumber': None
-                                })
-                    else:
-                        # Original line-by-line search
-                        lines = content.split('\n')
-                        for i, line in enumerate(lines):
-                            if search_in_line_excluding_wikilinks(line, search_pattern, exclude_wikilinks):
-                                match_info['matches'].append({
-                                    'type': 'content',
-                                    'original': line,
-                                    'lineNumber': i + 1
-                                })
-                except Exception as e:
-                    logger.error(f"Error reading file {file_info['fullPath']}: {e}")
-            
-            if match_info['matches']:
-                matches.append(match_info)
+        mode = search_mode(data)
+        matches = list(iter_search_matches(data, mode))
         
         total_matches = sum(len(m['matches']) for m in matches)
         
         return jsonify({
             'matches': matches,
             'totalFiles': len(matches),
-            'totalMatches': total_matches
+            'totalMatches': total_matches,
+            'mode': mode
         })
         
     except Exception as e:
         logger.error(f"Search error: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/preview', methods=['POST'])
-def preview_replace():
-    """Preview replace changes with multiline support"""
+@app.route('/api/search/stream', methods=['POST'])
+def search_stream():
+    """Stream search results as NDJSON: one record per matching file, then a summary"""
     try:
         data = request.json
-        search_pattern = data.get('searchPattern')
-        replace_pattern = data.get('replacePattern', '')
-        search_scope = data.get('searchScope')
-        target_path = data.get('targetPath', VAULT_PATH)
-        vault_path = data.get('vaultPath', VAULT_PATH)
-        target_file = data.get('targetFile')
-        exclude_wikilinks = data.get('excludeWikilinks', True)
-        multiline_mode = data.get('multilineMode', False)
-        delete_mode = data.get('deleteMode', False)
-        delete_trailing_linebreaks = data.get('deleteTrailingLineBreaks', True)
-        selected_files = data.get('selectedFiles', [])
         
-        if not search_pattern or not search_scope:
+        if not data.get('searchPattern') or not data.get('searchScope'):
             return jsonify({'error': 'Missing required parameters'}), 400
         
-        # Get files to search
-        if target_file:
-            files = [{
-                'fullPath': target_file,
-                'relativePath': os.path.relpath(target_file, vault_path),
-                'fileName': os.path.basename(target_file)
-            }]
-        else:
-            files = get_md_files(target_path or vault_path, vault_path)
+        mode = search_mode(data)
+        return stream_ndjson(iter_search_matches(data, mode), 'matches', 'totalMatches',
+                             lambda: {'mode': mode})
         
-        # Filter to only selected files if provided
-        if selected_files:
-            files = [f for f in files if f['fullPath'] in selected_files]
+    except Exception as e:
+        logger.error(f"Search error: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/preview', methods=['POST'])
+def preview_replace():
+    """Preview replace changes with multiline support"""
+    try:
+        data = request.json
         
-        previews = []
+        if not data.get('searchPattern') or not data.get('searchScope'):
+            return jsonify({'error': 'Missing required parameters'}), 400
         
-        for file_info in files:
-            preview = {
-                'fullPath': file_info['fullPath'],
-                'relativePath': file_info['relativePath'],
-                'fileName': file_info['fileName'],
-                'changes': []
-            }
-            
-            # Preview filename changes
-            if search_scope in ['names', 'both']:
-                if matches_wildcard(file_info['fileName'], search_pattern, multiline=False):
-                    if delete_mode:
-                        preview['changes'].append({
-                            'type': 'filename',
-                            'original': file_info['fileName'],
-                            'replacement': '[File will be renamed - pattern removed]'
-                        })
-                    else:
-                        new_name = replace_with_wildcard(file_info['fileName'], search_pattern, replace_pattern, multiline=False)
-                        preview['changes'].append({
-                            'type': 'filename',
-                            'original': file_info['fileName'],
-                            'replacement': new_name
-                        })
-            
-            # Preview content changes
-            if search_scope in ['contents', 'both']:
-                try:
-                    with open(file_info['fullPath'], 'r', encoding='utf-8') as f:
-                        content = f.read()
-                    
-                    if multiline_mode:
-                        # Check if pattern exists in content
-                        if search_in_content_multiline(content, search_pattern, exclude_wikilinks):
-                            # Show what will be changed
-                            if '*' not in search_pattern and '?' not in search_pattern:
-                                # For literal patterns
-                                pos = content.find(search_pattern)
-                                if pos != -1:
-                                    line_num = content[:pos].count('\n') + 1
-                                    
-                                    if delete_mode:
-                                        # Show what will be deleted
-                                        deleted_text = search_pattern
-                                        if delete_trailing_linebreaks and pos + len(search_pattern) < len(content) and content[pos + len(search_pattern)] == '\n':
-                                            deleted_text += '\\n'
-                                        
-                                        preview['changes'].append({
-                                            'type': 'content',
-                                            'original': deleted_text.replace('\n', '\\n'),
-                                            'replacement': '[Deleted]',
-                                            'lineNumber': line_num
-                                        })
-                                    else:
-                                        preview['changes'].append({
-                                            'type': 'content',
-                                            'original': search_pattern.replace('\n', '\\n'),
-                                            'replacement': replace_pattern.replace('\n', '\\n'),
-                                            'lineNumber': line_num
-                                        })
-                            else:
-                                # For wildcard patterns
-                                preview['changes'].append({
-                                    'type': 'content',
-                                    'original': f'[Multiline wildcard match for: {search_pattern}]',
-                                    'replacement': '[Content will be modified]' if not delete_mode else '[Content will be deleted]',
-                                    'lineNumber': None
-                                })
-                    else:
-                        # Original line-by-line preview
-                        lines = content.split('\n')
-                        for i, line in enumerate(lines):
-                            if search_in_line_excluding_wikilinks(line, search_pattern, exclude_wikilinks):
-                                if delete_mode:
-                                    # For delete mode, show what will be removed
-                                    new_line = replace_in_line_excluding_wikilinks(line, search_pattern, '', exclude_wikilinks)
-                                else:
-                                    new_line = replace_in_line_excluding_wikilinks(line, search_pattern, replace_pattern, exclude_wikilinks)
-                                
-                                if new_line != line:  # Only show if there's an actual change
-                                    preview['changes'].append({
-                                        'type': 'content',
-                                        'original': line,
-                                        'replacement': new_line if not delete_mode else '[Line content will be modified]',
-                                        'lineNumber': i + 1
-                                    })
-                except Exception as e:
-                    logger.error(f"Error reading file {file_info['fullPath']}: {e}")
-            
-            if preview['changes']:
-                previews.append(preview)
+        plan_entries = []
+        previews = list(iter_previews(data, plan_entries))
         
         total_changes = sum(len(p['changes']) for p in previews)
         
         return jsonify({
             'previews': previews,
             'totalFiles': len(previews),
-            'totalChanges': total_changes
+            'totalChanges': total_changes,
+            'planToken': store_replace_plan(data, plan_entries)
         })
         
     except Exception as e:
         logger.error(f"Preview error: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/preview/stream', methods=['POST'])
+def preview_replace_stream():
+    """Stream replace previews as NDJSON: one record per changed file, then a summary"""
+    try:
+        data = request.json
+        
+        if not data.get('searchPattern') or not data.get('searchScope'):
+            return jsonify({'error': 'Missing required parameters'}), 400
+        
+        plan_entries = []
+        return stream_ndjson(
+            iter_previews(data, plan_entries), 'changes', 'totalChanges',
+            lambda: {'planToken': store_replace_plan(data, plan_entries)}
+        )
+        
+    except Exception as e:
+        logger.error(f"Preview error: {e}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/replace', methods=['POST'])
+@vault_write
 def replace():
     """Perform replace operation with multiline support"""
     try:
@@ -1464,105 +4609,107 @@ def replace():
         delete_trailing_linebreaks = data.get('deleteTrailingLineBreaks', True)
         selected_files = data.get('selectedFiles', [])
         
-        if not search_pattern or not search_scope:
-            return jsonify({'error': 'Missing required parameters'}), 400
-        
-        # Create backup before modifications
-        backup_success, backup_path = create_backup()
-        if not backup_success:
-            return jsonify({'error': f'Failed to create backup: {backup_path}'}), 500
+        plan_token = data.get('planToken')
+        batch = WriteBatch()
         
-        # Get files to search
-        if target_file:
-            files = [{
-                'fullPath': target_file,
-                'relativePath': os.path.relpath(target_file, vault_path),
-                'fileName': os.path.basename(target_file)
-            }]
+        if plan_token:
+            # Apply the edits previewed by /api/preview instead of rescanning
+            plan = get_replace_plan(plan_token)
+            if plan is None:
+                return jsonify({'error': 'Preview plan not found or expired, please preview again'}), 400
+            
+            plan_request = plan['request']
+            search_pattern = plan_request.get('searchPattern')
+            replace_pattern = plan_request.get('replacePattern', '')
+            search_scope = plan_request.get('searchScope')
+            exclude_wikilinks = plan_request.get('excludeWikilinks', True)
+            multiline_mode = plan_request.get('multilineMode', False)
+            delete_mode = plan_request.get('deleteMode', False)
+            delete_trailing_linebreaks = plan_request.get('deleteTrailingLineBreaks', True)
+            
+            entries = plan['entries']
+            if selected_files:
+                entries = [e for e in entries if e['fullPath'] in selected_files]
+            
+            def replay_and_apply(entry):
+                current = replay_plan_entry(entry, plan_request)
+                if current is None:
+                    return {
+                        'fullPath': entry['fullPath'],
+                        'relativePath': entry['relativePath'],
+                        'fileName': entry['fileName'],
+                        'changes': 0,
+                        'status': 'stale'
+                    }
+                return stage_file_replace(current, batch)
+            
+            file_results = (replay_and_apply(entry) for entry in entries)
         else:
-            files = get_md_files(target_path or vault_path, vault_path)
-        
-        # Filter to only selected files if provided
-        if selected_files:
-            files = [f for f in files if f['fullPath'] in selected_files]
-        
-        results = []
-        
-        for file_info in files:
-            result = {
-                'fullPath': file_info['fullPath'],
-                'relativePath': file_info['relativePath'],
-                'fileName': file_info['fileName'],
-                'changes': 0
-            }
+            if not search_pattern or not search_scope:
+                return jsonify({'error': 'Missing required parameters'}), 400
             
-            # Replace in content first (before renaming file)
-            if search_scope in ['contents', 'both']:
-                try:
-                    with open(file_info['fullPath'], 'r', encoding='utf-8') as f:
-                        content = f.read()
-                    
-                    if multiline_mode:
-                        # Multiline replacement
-                        original_content = content
-                        new_content = replace_in_content_multiline(
-                            content, search_pattern, replace_pattern, 
-                            exclude_wikilinks, delete_mode, delete_trailing_linebreaks
-                        )
-                        
-                        if new_content != original_content:
-                            result['changes'] += 1
-                            with open(file_info['fullPath'], 'w', encoding='utf-8') as f:
-                                f.write(new_content)
-                    else:
-                        # Original line-by-line replacement
-                        lines = content.split('\n')
-                        new_lines = []
-                        changes_made = False
-                        
-                        for line in lines:
-                            if search_in_line_excluding_wikilinks(line, search_pattern, exclude_wikilinks):
-                                if delete_mode:
-                                    new_line = replace_in_line_excluding_wikilinks(line, search_pattern, '', exclude_wikilinks)
-                                else:
-                                    new_line = replace_in_line_excluding_wikilinks(line, search_pattern, replace_pattern, exclude_wikilinks)
-                                
-                                if new_line != line:
-                                    result['changes'] += 1
-                                    changes_made = True
-                                new_lines.append(new_line)
-                            else:
-                                new_lines.append(line)
-                        
-                        if changes_made:
-                            new_content = '\n'.join(new_lines)
-                            with open(file_info['fullPath'], 'w', encoding='utf-8') as f:
-                                f.write(new_content)
-                            
-                except Exception as e:
-                    logger.error(f"Error processing file {file_info['fullPath']}: {e}")
+            # Get files to search
+            if target_file:
+                files = [{
+                    'fullPath': target_file,
+                    'relativePath': os.path.relpath(target_file, vault_path),
+                    'fileName': os.path.basename(target_file)
+                }]
+            else:
+                files = get_md_files(target_path or vault_path, vault_path)
             
-            # Replace in filename
-            if search_scope in ['names', 'both']:
-                if matches_wildcard(file_info['fileName'], search_pattern, multiline=False):
-                    if delete_mode:
-                        # For delete mode in filenames, remove the matched pattern
-                        new_name = file_info['fileName'].replace(search_pattern, '')
-                    else:
-                        new_name = replace_with_wildcard(file_info['fileName'], search_pattern, replace_pattern, multiline=False)
-                    
-                    new_path = os.path.join(os.path.dirname(file_info['fullPath']), new_name)
-                    
-                    try:
-                        os.rename(file_info['fullPath'], new_path)
-                        result['changes'] += 1
-                        result['newFileName'] = new_name
-                    except Exception as e:
-                        logger.error(f"Error renaming file: {e}")
+            # Filter to only selected files if provided
+            if selected_files:
+                files = [f for f in files if f['fullPath'] in selected_files]
+            
+            def plan_and_apply(file_info):
+                content = None
+                if search_scope in ['contents', 'both']:
+                    content = read_note_content(file_info['fullPath'])
+                entry = plan_file_replace(
+                    file_info, content, search_pattern, replace_pattern, search_scope, exclude_wikilinks,
+                    multiline_mode, delete_mode, delete_trailing_linebreaks
+                )
+                return stage_file_replace(entry, batch) if entry else None
             
-            if result['changes'] > 0:
+            file_results = (plan_and_apply(file_info) for file_info in files)
+        
+        results = []
+        skipped = []
+        
+        for result in file_results:
+            if result is None:
+                continue
+            if result.get('status') == 'stale':
+                # Changed since preview; leave it for the user to preview again
+                skipped.append(result)
+            elif result['changes'] > 0:
                 results.append(result)
         
+        # Create backup before modifications, covering only what the batch will touch
+        backup_success, backup_path = backup_batch(batch)
+        if not backup_success:
+            # The plan is kept, so the user can retry without previewing again
+            return jsonify({'error': f'Failed to create backup: {backup_path}'}), 500
+        if plan_token:
+            discard_replace_plan(plan_token)
+        
+        # Write and rename all files at once, or none of them
+        statuses = {status['path']: status['status'] for status in batch.commit()}
+        for result in results:
+            result['status'] = statuses.get(result['fullPath'], 'unchanged')
+        if not batch.succeeded:
+            return jsonify({
+                'error': 'Failed to apply changes; no files were modified',
+                'results': results,
+                'backup_path': backup_path
+            }), 500
+        
+        for result in results:
+            if 'newFileName' in result:
+                new_path = os.path.join(os.path.dirname(result['fullPath']), result['newFileName'])
+                record_journal_rename(backup_path, result['fullPath'], new_path)
+        
         total_changes = sum(r['changes'] for r in results)
         
         log_change('search_replace', {
@@ -1574,16 +4721,21 @@ def replace():
             'delete_mode': delete_mode,
             'delete_trailing_linebreaks': delete_trailing_linebreaks,
             'files_modified': len(results),
+            'files': [r['relativePath'] for r in results],
             'total_changes': total_changes,
             'backup_path': backup_path,
-            'selected_files_count': len(selected_files) if selected_files else 'all'
+            'selected_files_count': len(selected_files) if selected_files else 'all',
+            'from_preview': bool(plan_token),
+            'skipped_files': [r['relativePath'] for r in skipped]
         })
         
         return jsonify({
             'results': results,
+            'skippedFiles': skipped,
             'totalFilesModified': len(results),
             'totalChanges': total_changes,
-            'backup_path': backup_path
+            'backup_path': backup_path,
+            'operation_id': journal_operation_id(backup_path)
         })
         
     except Exception as e:
@@ -1764,5 +4916,16 @@ if __name__ == '__main__':
     print(f"Port {port} has been saved to {server_config_file}")
     print("\nPress Ctrl+C to stop the server")
     
-    # Run without debug mode to avoid auto-reloading issues
-    app.run(host='0.0.0.0', port=port, debug=False)
\ No newline at end of file
+    # Index the vault once (warm from the saved index) and keep it current
+    start_vault_watcher(VAULT_PATH)
+    vault_index_store.start()
+    
+    # waitress serves requests on a thread pool in this one process, so every
+    # thread shares the caches, indexes and vault watcher (separate worker
+    # processes would each rebuild and watch the vault). --dev forces Flask's server.
+    if waitress is not None and '--dev' not in sys.argv:
+        print(f"Serving with waitress ({SERVER_THREADS} threads)")
+        waitress.serve(app, host='0.0.0.0', port=port, threads=SERVER_THREADS)
+    else:
+        # Run without debug mode to avoid auto-reloading issues
+        app.run(host='0.0.0.0', port=port, debug=False, threaded=True)
\ No newline at end of file
@@ -12,11 +12,17 @@ if [ ! -d "venv" ]; then
     python3 -m venv venv
     source venv/bin/activate
     echo "📦 Installing required packages..."
-    pip install flask flask-cors pyyaml
+    pip install flask flask-cors pyyaml waitress
 else
     source venv/bin/activate
 fi
 
+# waitress serves requests on a thread pool, so long operations don't block the other tabs
+if ! python -c "import waitress" 2>/dev/null; then
+    echo "📦 Installing waitress (production server)..."
+    pip install waitress
+fi
+
 # Backup reminder
 echo "📦 Automatic Backup Protection Enabled"
 echo "   Your vault will be automatically backed up before any modifications"
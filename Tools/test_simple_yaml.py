@@ -0,0 +1,93 @@
+"""Differential test: scan_simple_yaml must agree with yaml.safe_load.
+
+Run with: python -m pytest Tools/test_simple_yaml.py
+"""
+
+import os
+import random
+import sys
+
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from obsidian_tools_server import scan_simple_yaml
+
+KEYS = ['Category', 'tags', 'aliases', 'Created', 'Employer', 'Team', '2024', 'yes', 'null',
+        'a:b', 'x y', 'é', '-k', '"q"', '~', '<<', 'key ', '#c', 'Stakeholder']
+
+# Scalars the fast path handles plus the YAML corner cases it must hand back to the parser
+SCALARS = ['[[👥 People]]', '"[[👥 People]]"', "'[[Tag 3]]'", 'Microsoft', '2024-06-14',
+           '2024-06-14 10:00:00', '2024-06-14T10:00:00Z', 'true', 'Yes', 'off', 'null', '~', '',
+           '12', '0x1F', '012', '1.5', '1e3', '.inf', '-3', '+4', 'a: b', 'a #c', 'a#b',
+           'http://x.y/z', '"esc\\"q"', "'it''s'", '"a\\tb"', '[a, b]', '{a: 1}', '&x a', '*x',
+           '!str 3', '| x', '> x', '%x', '@x', '`x', '?x', ': x', '- x', '-x', 'plain text here',
+           '1_000', '0b101', '1:30', '190:20:30', '=', '<<', '"unterminated', "'", '"', ' sp',
+           'sp ', '😀 emoji', 'a\xa0b', '\xa0', '日本']
+
+ODD_LINES = ['# comment', '  continued', 'key:value', '...', '\t- t', 'k: v\r', '']
+
+
+def random_frontmatter(rng):
+    """A frontmatter block mixing common Obsidian shapes with awkward ones"""
+    lines = [rng.choice(['', '\n', ' \n'])]
+    for _ in range(rng.randint(0, 6)):
+        key = rng.choice(KEYS)
+        r = rng.random()
+        if r < 0.55:
+            lines.append(f"{key}: {rng.choice(SCALARS)}")
+        elif r < 0.85:
+            indent = rng.choice(['', '  ', '    '])
+            lines.append(f"{key}:")
+            for _ in range(rng.randint(0, 3)):
+                lines.append(f"{indent}- {rng.choice(SCALARS)}" if rng.random() < 0.9 else f"{indent}-")
+            if rng.random() < 0.05:
+                lines.append(' - odd')
+        elif r < 0.9:
+            lines.append(f"{key}:")
+        elif r < 0.95:
+            lines.append(rng.choice(ODD_LINES))
+        else:
+            lines.append(f"{key}: {rng.choice(SCALARS)} ")
+    return '\n'.join(lines) + rng.choice(['\n', ''])
+
+
+def safe_load_or_error(text):
+    try:
+        return yaml.safe_load(text)
+    except yaml.YAMLError as e:
+        return e
+
+
+def assert_same_as_safe_load(text):
+    result = scan_simple_yaml(text)
+    if result is None:
+        # Left to the full parser
+        return False
+    expected = safe_load_or_error(text)
+    assert isinstance(expected, dict), f"{text!r}: scanner accepted {result!r}, safe_load gave {expected!r}"
+    assert list(result) == list(expected), repr(text)
+    assert result == expected, repr(text)
+    assert [type(v) for v in result.values()] == [type(v) for v in expected.values()], repr(text)
+    return True
+
+
+def test_random_frontmatter_matches_safe_load():
+    rng = random.Random(0)
+    scanned = sum(assert_same_as_safe_load(random_frontmatter(rng)) for _ in range(20000))
+    assert scanned > 0
+
+
+def test_typical_frontmatter_takes_fast_path():
+    rng = random.Random(5)
+    values = ['"[[👥 People]]"', '"[[Tag 3]]"', 'Microsoft', '2024-06-14', 'true', '12',
+              'plain text here', '"[[Note, with comma]]"', "'quoted'", '']
+    for _ in range(2000):
+        lines = ['']
+        for key in rng.sample(['Category', 'tags', 'aliases', 'Created', 'Employer', 'Team',
+                               'Subcategory', 'Obsidian'], 5):
+            if rng.random() < 0.6:
+                lines.append(f"{key}: {rng.choice(values)}")
+            else:
+                lines.append(f"{key}:")
+                lines += [f"  - {rng.choice(values[:-1])}" for _ in range(rng.randint(0, 3))]
+        assert assert_same_as_safe_load('\n'.join(lines) + '\n')
@@ -0,0 +1,75 @@
+"""Wildcard search, preview, plan and replace must agree around wikilinks.
+
+Run with: python -m pytest Tools/test_wildcard_replace.py
+"""
+
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from obsidian_tools_server import (
+    plan_file_replace,
+    preview_file,
+    search_in_content_multiline,
+    search_in_line_excluding_wikilinks,
+)
+
+FILE_INFO = {'fullPath': '/vault/Note.md', 'relativePath': 'Note.md', 'fileName': 'Note.md'}
+
+
+def preview(content, pattern, replacement='Z', **options):
+    return preview_file(FILE_INFO, content, pattern, replacement, 'contents', **options)
+
+
+def planned_content(content, pattern, replacement='Z', **options):
+    entry = plan_file_replace(FILE_INFO, content, pattern, replacement, 'contents', **options)
+    return entry['newContent'] if entry else None
+
+
+def test_line_wildcard_across_wikilink():
+    line = 'foo [[x]] bar'
+    assert search_in_line_excluding_wikilinks(line, 'foo*bar')
+    changes = preview(line, 'foo*bar')['changes']
+    assert [change['replacement'] for change in changes] == ['Z[[x]]']
+    assert planned_content(line, 'foo*bar') == 'Z[[x]]'
+
+
+def test_multiline_wildcard_across_wikilink():
+    content = 'alpha\n[[x]]\nomega'
+    assert search_in_content_multiline(content, 'alpha*omega')
+    assert preview(content, 'alpha*omega', multiline_mode=True) is not None
+    assert planned_content(content, 'alpha*omega', multiline_mode=True) == 'Z[[x]]'
+    assert planned_content(content + '\nrest', 'alpha*omega\n*', multiline_mode=True, delete_mode=True) == '[[x]]'
+
+
+def test_trailing_wildcard_replaces_whole_line_with_or_without_wikilinks():
+    assert planned_content('foo bar', 'foo*') == 'Z'
+    assert planned_content('foo [[x]] bar', 'foo*') == 'Z[[x]]'
+    assert planned_content('keep\nfoo [[x]] bar\nkeep', 'foo*') == 'keep\nZ[[x]]\nkeep'
+
+
+def test_literal_inside_wikilink_is_not_matched():
+    line = '[[foo]] bar'
+    assert not search_in_line_excluding_wikilinks(line, 'foo*')
+    assert preview(line, 'foo*') is None
+    assert planned_content(line, 'foo*') is None
+
+
+def test_preview_and_plan_agree_with_search():
+    rng = random.Random(0)
+    words = ['foo', 'bar', '[[foo]]', '[[x|bar]]', 'baz', ' ', '']
+    patterns = ['foo*', '*bar', 'foo*bar', '*o*', 'ba?', '[[*', '*]] *', 'f?o*[[x*']
+    for _ in range(2000):
+        content = '\n'.join(' '.join(rng.choice(words) for _ in range(rng.randint(1, 4)))
+                            for _ in range(rng.randint(1, 3)))
+        pattern = rng.choice(patterns)
+        for multiline_mode in (False, True):
+            new_content = planned_content(content, pattern, multiline_mode=multiline_mode)
+            if multiline_mode:
+                hit = search_in_content_multiline(content, pattern)
+            else:
+                hit = any(search_in_line_excluding_wikilinks(line, pattern) for line in content.split('\n'))
+            assert (new_content is not None) == hit, (content, pattern, multiline_mode)
+            previewed = preview(content, pattern, multiline_mode=multiline_mode)
+            assert (previewed is not None) == hit, (content, pattern, multiline_mode)